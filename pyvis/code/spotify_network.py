@@ -1,25 +1,29 @@
-from collections import defaultdict
+import os
+import sys
+
 from pyvis.network import Network
 import pandas as pd
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from helpers.compact import show_compact
+from helpers.graph_frame import GraphFrame
+from helpers.layout import fix_layout
+
 def construct_network(df):
     
     g = Network("800px", "100%", bgcolor="#3c4647", font_color="white")
-    for artist in df.artist:
-        g.add_node(artist, label=artist, color="#26d18f")
-    for related in df.related:
-        g.add_node(related, label=related, color="#8965c7")
-    g.add_edges(list(zip(df.artist, df.related)))
-    counts = df.related.value_counts()
-    for node in g.nodes:
-        freq = str(counts.get(node['id'], 1))
-        # nodes with a value will scale their size
-        # nodes with a title will include a hover tooltip on the node
-        node.update({"value": freq, "title": f"Frequency: {freq}"})
+    frame = GraphFrame()
+    frame.add_nodes(df.artist, color="#26d18f")
+    frame.add_nodes(df.related, color="#8965c7")
+    frame.add_edges(df.artist, df.related)
+    freq = df.related.value_counts().astype(str)
+    # nodes with a value will scale their size
+    # nodes with a title will include a hover tooltip on the node
+    frame.set_node_attr("value", freq, default="1")
+    frame.set_node_attr("title", "Frequency: " + freq.reindex(frame.ids, fill_value="1"))
+    sources, targets = frame.edge_ends()
+    frame.set_edge_attr("title", sources.astype(str) + " ---> " + targets.astype(str))
     g.inherit_edge_colors("to")
-    for e in g.edges:
-        edge_label = f'{e["from"]} ---> {e["to"]}'
-        e.update({"title": edge_label})
     g.barnes_hut(
         gravity=-17950,
         central_gravity=4.1,
@@ -28,8 +32,10 @@ def construct_network(df):
         damping=.66,
         overlap=1
     )
-    g.show("spotify_example.html")
+    # run the physics here and write the final positions, the page opens already laid out
+    fix_layout(frame, g)
+    show_compact(frame, g, "spotify_example.html", sidecar=False)
 
 if __name__ == "__main__":
     artists_connected = pd.read_csv("spotify_data.csv")
-    construct_network(artists_connected)
\ No newline at end of file
+    construct_network(artists_connected)
@@ -0,0 +1,183 @@
+'''
+Compact output for networks built with a GraphFrame. Network.show writes every node and edge into
+the page as a JSON object, repeating the keys and long strings such as tooltips. Here the
+attributes are written column by column: attributes shared by all nodes or edges once, strings as
+indices into one table of distinct strings and other values as plain lists. The data goes to a
+sidecar file, optionally gzipped, that the page fetches and turns back into vis.js DataSets.
+
+Browsers do not let pages opened from disk fetch other files, so pages with a sidecar file have
+to be served, e.g. with python -m http.server, or written with sidecar=False.
+'''
+import gzip
+import json
+import os
+import string
+import webbrowser
+
+import numpy
+import pandas
+
+from .graph_frame import _values
+
+TEMPLATE = string.Template('''<html>
+<head>
+<link rel="stylesheet" href="https://cdnjs.cloudflare.com/ajax/libs/vis/4.16.1/vis.css" type="text/css" />
+<script type="text/javascript" src="https://cdnjs.cloudflare.com/ajax/libs/vis/4.16.1/vis-network.min.js"> </script>
+
+<style type="text/css">
+
+        #mynetwork {
+            width: $width;
+            height: $height;
+            background-color: $bgcolor;
+            border: 1px solid lightgray;
+            position: relative;
+            float: left;
+        }
+
+</style>
+
+</head>
+
+<body>
+<div id="mynetwork"></div>
+$inline
+<script type="text/javascript">
+
+    var container = document.getElementById("mynetwork");
+    var options = $options;
+
+    // rebuilds the rows of a table of columns, leaving out missing values
+    function decodeTable(table, strings) {
+        var rows = [];
+        for (var i = 0; i < table.count; i++) {
+            rows.push({});
+        }
+        Object.keys(table.columns).forEach(function (name) {
+            var column = table.columns[name];
+            for (var i = 0; i < table.count; i++) {
+                var value;
+                if ("c" in column) {
+                    value = column.c;
+                } else if ("s" in column) {
+                    value = column.s[i] < 0 ? null : strings[column.s[i]];
+                } else {
+                    value = column.v[i];
+                }
+                if (value !== null) {
+                    rows[i][name] = value;
+                }
+            }
+        });
+        return rows;
+    }
+
+    function draw(data) {
+        var nodes = new vis.DataSet(decodeTable(data.nodes, data.strings));
+        var edges = new vis.DataSet(decodeTable(data.edges, data.strings));
+        return new vis.Network(container, {nodes: nodes, edges: edges}, options);
+    }
+
+    function readData(buffer) {
+        var bytes = new Uint8Array(buffer);
+        // servers may already have removed the gzip encoding
+        if (bytes[0] === 0x1f && bytes[1] === 0x8b) {
+            var stream = new Blob([bytes]).stream().pipeThrough(new DecompressionStream("gzip"));
+            return new Response(stream).text();
+        }
+        return new TextDecoder().decode(bytes);
+    }
+
+    var inline = document.getElementById("graph-data");
+    if (inline) {
+        draw(JSON.parse(inline.textContent));
+    } else {
+        fetch($url)
+            .then(function (response) { return response.arrayBuffer(); })
+            .then(readData)
+            .then(function (text) { draw(JSON.parse(text)); })
+            .catch(function (error) {
+                container.textContent = "Could not load " + $url + " (" + error + "), serve this page " +
+                    "over http, e.g. with python -m http.server";
+            });
+    }
+
+</script>
+</body>
+</html>
+''')
+
+
+def _encode_column(column, size, strings):
+    '''
+    Column as {"c": value} when the same for all rows, {"s": indices} for strings, with -1 for
+    missing values, and {"v": values} otherwise
+    '''
+    values = _values(column, size)
+    if values.strides == (0,) or size == 0:
+        return {'c': values[:1].tolist()[0] if size else None}
+    # JSON has no NaN, missing numbers are written as null
+    missing = pandas.isna(values)
+    if missing.any():
+        values = numpy.where(missing, None, values.astype(object))
+    if values.dtype == object and pandas.api.types.infer_dtype(values, skipna=True) in ('string', 'empty'):
+        codes, uniques = pandas.factorize(values)
+        table = numpy.array([strings.setdefault(value, len(strings)) for value in uniques] + [-1])
+        return {'s': table[codes].tolist()}
+    return {'v': values.tolist()}
+
+
+def encode(frame, net):
+    '''
+    Compact, JSON serializable form of the nodes and edges of a GraphFrame for a pyvis Network
+    '''
+    nodes, edges = frame.columns(net)
+    strings = {}
+    data = {
+        'nodes': {'count': frame.num_nodes,
+                  'columns': {name: _encode_column(c, frame.num_nodes, strings) for name, c in nodes.items()}},
+        'edges': {'count': frame.num_edges,
+                  'columns': {name: _encode_column(c, frame.num_edges, strings) for name, c in edges.items()}},
+    }
+    data['strings'] = list(strings)
+    return data
+
+
+def write_compact(frame, net, name, compress=False, sidecar=True):
+    '''
+    Writes the page of a GraphFrame with the options of a pyvis Network, like Network.write_html
+    @param name     path of the html file
+    @param compress gzip the sidecar file
+    @param sidecar  write the data to name without .html plus .graph.json, or .graph.json.gz,
+                    instead of into the page
+    @return the paths of the written files
+    '''
+    data = json.dumps(encode(frame, net), separators=(',', ':'))
+    options = json.dumps(net.options) if isinstance(net.options, dict) else net.options.to_json()
+    paths = [name]
+    inline = url = ''
+    if sidecar:
+        path = os.path.splitext(name)[0] + '.graph.json' + ('.gz' if compress else '')
+        url = json.dumps(os.path.basename(path))
+        if compress:
+            with gzip.open(path, 'wb', compresslevel=6) as out:
+                out.write(data.encode())
+        else:
+            with open(path, 'w') as out:
+                out.write(data)
+        paths.append(path)
+    else:
+        inline = '<script type="application/json" id="graph-data">{}</script>'.format(data.replace('</', '<\\/'))
+    with open(name, 'w') as out:
+        out.write(TEMPLATE.substitute(width=net.width, height=net.height, bgcolor=net.bgcolor,
+                                      options=options, inline=inline, url=url or '""'))
+    return paths
+
+
+def show_compact(frame, net, name, compress=False, sidecar=True):
+    '''
+    Writes the page with write_compact and opens it, like Network.show
+    '''
+    paths = write_compact(frame, net, name, compress, sidecar)
+    webbrowser.open(name)
+    return paths
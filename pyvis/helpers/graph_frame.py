@@ -0,0 +1,336 @@
+'''
+Bulk construction of pyvis networks from edge lists. Network.add_node and Network.add_edge check
+for existing nodes and edges with linear scans, so building a graph one row at a time is
+quadratic. Here node ids are deduplicated with a single factorization of the edge list and the
+node and edge records are built in one pass.
+
+GraphFrame goes further and keeps the nodes and edges as columns, one array per attribute,
+instead of one dict per node and edge. Attributes are set in bulk and the pyvis records are only
+built once, when the frame is written into a Network.
+'''
+import numpy
+import pandas
+
+
+def _edge_columns(edges, source, target, weight):
+    '''
+    Returns (sources, targets, weights) arrays from a DataFrame or a tuple of arrays
+    '''
+    if isinstance(edges, pandas.DataFrame):
+        weights = edges[weight] if weight is not None and weight in edges else None
+        edges = (edges[source], edges[target], weights)
+    sources, targets, weights = (tuple(edges) + (None,))[:3]
+    return numpy.asarray(sources), numpy.asarray(targets), None if weights is None else numpy.asarray(weights)
+
+
+def _first_edges(lo, hi, n):
+    '''
+    Positions of the first occurrence of each (lo, hi) pair, in order
+    '''
+    _, first = numpy.unique(lo.astype(numpy.int64) * n + hi, return_index=True)
+    return numpy.sort(first)
+
+
+def add_edge_frame(net, edges, source='Source', target='Target', weight='Weight',
+                   weight_option='value', titles=False, **node_options):
+    '''
+    Adds the nodes and edges of an edge list to a pyvis Network, giving the same nodes and edges
+    as calling add_node for both ends and add_edge for each row in order
+    @param net           the pyvis Network
+    @param edges         DataFrame with source, target and optional weight columns, or a
+                         (sources, targets) or (sources, targets, weights) tuple of arrays
+    @param weight_option edge option set to the weight, value scales the edge width
+    @param titles        use the node ids as hover titles of the new nodes
+    @param node_options  options shared by all new nodes, e.g. color
+    '''
+    sources, targets, weights = _edge_columns(edges, source, target, weight)
+    # the frame starts with the nodes and edges of net so that add_edges skips the same edges
+    frame = GraphFrame(net.directed)
+    frame.add_nodes(net.node_ids)
+    frame.add_edges([e['from'] for e in net.edges], [e['to'] for e in net.edges])
+    first_node, first_edge = frame.num_nodes, frame.num_edges
+    # interleaving the ends keeps the order in which add_node would have seen the ids
+    ends = numpy.column_stack([sources, targets]).ravel()
+    frame.add_nodes(ends, **dict(node_options, **({'title': ends} if titles else {})))
+    frame.add_edges(sources, targets, **({} if weights is None else {weight_option: weights}))
+    return frame._append_to(net, first_node, first_edge)
+
+
+class AdjacencyIndex:
+    '''
+    Compressed sparse row adjacency of a network. The neighbors of the node at position i of ids
+    are neighbors[offsets[i]:offsets[i + 1]], positions into ids in increasing order. Like
+    Network.get_adj_list, each neighbor is listed once and undirected edges count for both ends.
+    @param ids       node ids
+    @param offsets   (nodes + 1,) start of the neighbors of each node
+    @param neighbors positions of the neighbors of all nodes, one node after the other
+    '''
+
+    def __init__(self, ids, offsets, neighbors):
+        self.ids = pandas.Index(ids)
+        self.offsets = offsets
+        self.neighbors = neighbors
+
+    @classmethod
+    def from_codes(cls, ids, sources, targets, directed=False):
+        '''
+        Builds the index from the positions of the edge ends in ids
+        '''
+        n = len(ids)
+        sources = numpy.asarray(sources, dtype=numpy.int64)
+        targets = numpy.asarray(targets, dtype=numpy.int64)
+        if not directed:
+            sources, targets = numpy.concatenate([sources, targets]), numpy.concatenate([targets, sources])
+        # sorted unique keys are already grouped by source, with the neighbors in order
+        keys = numpy.unique(sources * n + targets)
+        offsets = numpy.zeros(n + 1, dtype=numpy.int64)
+        numpy.cumsum(numpy.bincount(keys // n, minlength=n), out=offsets[1:])
+        return cls(ids, offsets, keys % n)
+
+    @classmethod
+    def from_network(cls, net):
+        '''
+        Builds the index of a pyvis Network from its edge list
+        '''
+        ids = pandas.Index(net.node_ids)
+        sources = ids.get_indexer([e['from'] for e in net.edges])
+        targets = ids.get_indexer([e['to'] for e in net.edges])
+        return cls.from_codes(ids, sources, targets, net.directed)
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def degrees(self):
+        '''
+        Number of neighbors of every node
+        '''
+        return numpy.diff(self.offsets)
+
+    def neighbors_of(self, node_id):
+        '''
+        Ids of the neighbors of a node
+        '''
+        i = self.ids.get_loc(node_id)
+        return self.ids.take(self.neighbors[self.offsets[i]:self.offsets[i + 1]]).tolist()
+
+    def neighbor_titles(self, sep='<br>'):
+        '''
+        The neighbor ids of every node joined by sep, e.g. for hover titles
+        '''
+        names = [str(name) for name in self.ids.take(self.neighbors)]
+        offsets = self.offsets.tolist()
+        return [sep.join(names[start:stop]) for start, stop in zip(offsets[:-1], offsets[1:])]
+
+
+def _values(values, size):
+    '''
+    (size,) array of the values, broadcasting scalars, with strings kept as Python objects
+    '''
+    values = numpy.asarray(values)
+    if values.dtype.kind in 'US':
+        values = values.astype(object)
+    if values.ndim == 0:
+        return numpy.broadcast_to(values, (size,))
+    if len(values) != size:
+        raise ValueError('expected {} values, got {}'.format(size, len(values)))
+    return values
+
+
+def _assign(column, size, positions, values):
+    '''
+    Sets column[positions] to values, creating the column if needed. Entries that were never
+    set are None.
+    '''
+    values = _values(values, len(positions))
+    if column is None:
+        if len(positions) == size:
+            column = numpy.empty(size, dtype=values.dtype)
+        else:
+            column = numpy.full(size, None, dtype=object)
+    dtype = numpy.result_type(column, values)
+    if dtype != column.dtype:
+        column = column.astype(dtype)
+    column[positions] = values
+    return column
+
+
+def _extend(columns, count):
+    '''
+    Grows every column by count unset entries
+    '''
+    for name, column in columns.items():
+        columns[name] = numpy.concatenate([column, numpy.full(count, None, dtype=object)])
+
+
+def _records(columns, size):
+    '''
+    One dict per row of the columns, leaving out unset entries
+    '''
+    names = list(columns)
+    rows = zip(*[_values(column, size).tolist() for column in columns.values()])
+    return [{name: value for name, value in zip(names, row) if value is not None} for row in rows]
+
+
+def _tail(columns, first):
+    '''
+    The rows of the columns from position first on, scalars stay as they are
+    '''
+    return {name: column if numpy.ndim(column) == 0 else column[first:] for name, column in columns.items()}
+
+
+class GraphFrame:
+    '''
+    Columnar store of the nodes and edges of a network. Nodes are the positions of ids and edges
+    the positions of their ends in sources and targets. Attributes are arrays aligned with them
+    in node_attrs and edge_attrs, with None for entries that were never set.
+    @param directed keep every edge instead of only the first one between two nodes
+    '''
+
+    def __init__(self, directed=False):
+        self.directed = directed
+        self.ids = pandas.Index([], dtype=object)
+        self.sources = numpy.empty(0, dtype=numpy.int64)
+        self.targets = numpy.empty(0, dtype=numpy.int64)
+        self.node_attrs = {}
+        self.edge_attrs = {}
+
+    @classmethod
+    def from_edge_frame(cls, edges, source='Source', target='Target', weight='Weight',
+                        weight_option='value', directed=False):
+        '''
+        Frame of an edge list given like for add_edge_frame
+        '''
+        sources, targets, weights = _edge_columns(edges, source, target, weight)
+        frame = cls(directed)
+        frame.add_edges(sources, targets, **({} if weights is None else {weight_option: weights}))
+        return frame
+
+    @property
+    def num_nodes(self):
+        return len(self.ids)
+
+    @property
+    def num_edges(self):
+        return len(self.sources)
+
+    def add_nodes(self, ids, **attrs):
+        '''
+        Adds the ids that are not nodes yet, in order, and sets attrs of the new nodes only,
+        like Network.add_node
+        @param ids   node ids, repeats are allowed
+        @param attrs scalars or arrays aligned with ids
+        '''
+        codes, uniques = pandas.factorize(numpy.asarray(ids))
+        _, first = numpy.unique(codes, return_index=True)
+        new = ~pandas.Index(uniques).isin(self.ids)
+        start = self.num_nodes
+        self.ids = self.ids.append(pandas.Index(uniques[new], dtype=object))
+        _extend(self.node_attrs, int(new.sum()))
+        positions = numpy.arange(start, self.num_nodes)
+        for name, values in attrs.items():
+            values = numpy.asarray(values)
+            values = values if values.ndim == 0 else values[first[new]]
+            self.node_attrs[name] = _assign(self.node_attrs.get(name), self.num_nodes, positions, values)
+
+    def add_edges(self, sources, targets, **attrs):
+        '''
+        Adds edges between node ids, adding missing nodes first. Unless directed, an edge
+        between two nodes that are already connected is skipped, like in Network.add_edge.
+        @param attrs scalars or arrays aligned with sources and targets
+        '''
+        sources, targets = numpy.asarray(sources), numpy.asarray(targets)
+        self.add_nodes(numpy.column_stack([sources, targets]).ravel())
+        src, dst = self.ids.get_indexer(sources), self.ids.get_indexer(targets)
+        keep = numpy.arange(len(src))
+        if not self.directed:
+            lo = numpy.concatenate([numpy.minimum(self.sources, self.targets), numpy.minimum(src, dst)])
+            hi = numpy.concatenate([numpy.maximum(self.sources, self.targets), numpy.maximum(src, dst)])
+            keep = _first_edges(lo, hi, self.num_nodes) - self.num_edges
+            keep = keep[keep >= 0]
+        start = self.num_edges
+        self.sources = numpy.concatenate([self.sources, src[keep]])
+        self.targets = numpy.concatenate([self.targets, dst[keep]])
+        _extend(self.edge_attrs, len(keep))
+        positions = numpy.arange(start, self.num_edges)
+        for name, values in attrs.items():
+            values = numpy.asarray(values)
+            values = values if values.ndim == 0 else values[keep]
+            self.edge_attrs[name] = _assign(self.edge_attrs.get(name), self.num_edges, positions, values)
+
+    def set_node_attr(self, name, values, default=None):
+        '''
+        Sets an attribute of all nodes
+        @param values  a scalar, an array aligned with ids, or a Series or dict keyed by node
+                       id, e.g. from value_counts
+        @param default value of the nodes missing from a Series or dict
+        '''
+        if isinstance(values, dict):
+            values = pandas.Series(values)
+        if isinstance(values, pandas.Series):
+            values = values.reindex(self.ids)
+            values = values.astype(object).where(values.notna(), default).to_numpy()
+        self.node_attrs[name] = _assign(None, self.num_nodes, numpy.arange(self.num_nodes), values)
+
+    def set_edge_attr(self, name, values):
+        '''
+        Sets an attribute of all edges
+        @param values a scalar or an array or Series aligned with the edges
+        '''
+        if isinstance(values, pandas.Series):
+            values = values.to_numpy()
+        self.edge_attrs[name] = _assign(None, self.num_edges, numpy.arange(self.num_edges), values)
+
+    def edge_ends(self):
+        '''
+        (source ids, target ids) of the edges
+        '''
+        return self.ids.take(self.sources), self.ids.take(self.targets)
+
+    def adjacency(self):
+        '''
+        AdjacencyIndex of the frame
+        '''
+        return AdjacencyIndex.from_codes(self.ids, self.sources, self.targets, self.directed)
+
+    def columns(self, net):
+        '''
+        (node columns, edge columns) with the same defaults as Network.add_node and
+        Network.add_edge for a pyvis Network, attributes that are the same for all nodes or
+        edges are scalars
+        '''
+        ids = self.ids.to_numpy()
+        nodes = {'id': ids, 'label': ids, 'shape': 'dot'}
+        if net.font_color:
+            nodes['font'] = numpy.array({'color': net.font_color}, dtype=object)
+        nodes.update(self.node_attrs)
+        if 'label' in self.node_attrs:
+            nodes['label'] = numpy.where(numpy.equal(nodes['label'], None), ids, nodes['label'])
+        sources, targets = self.edge_ends()
+        edges = {'from': sources.to_numpy(), 'to': targets.to_numpy()}
+        if self.directed:
+            edges['arrows'] = 'to'
+        edges.update(self.edge_attrs)
+        return nodes, edges
+
+    def to_network(self, net):
+        '''
+        Replaces the nodes and edges of a pyvis Network with the records of the frame
+        '''
+        net.nodes, net.node_ids, net.edges = [], [], []
+        return self._append_to(net, 0, 0)
+
+    def _append_to(self, net, first_node, first_edge):
+        '''
+        Appends the records of the nodes and edges from the given positions on to a pyvis Network
+        '''
+        nodes, edges = self.columns(net)
+        new_nodes = _records(_tail(nodes, first_node), self.num_nodes - first_node)
+        if net.font_color and 'font' not in self.node_attrs:
+            # every node gets its own font options, like from Network.add_node
+            for node in new_nodes:
+                node['font'] = dict(node['font'])
+        net.nodes.extend(new_nodes)
+        net.node_ids.extend(self.ids[first_node:].tolist())
+        net.edges.extend(_records(_tail(edges, first_edge), self.num_edges - first_edge))
+        return net
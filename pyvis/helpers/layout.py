@@ -0,0 +1,301 @@
+'''
+Force directed layout computed in Python, so that pages open with the nodes already in place
+instead of running the physics simulation in the browser. The forces, the integration and the
+parameters follow the barnesHut and forceAtlas2Based solvers of vis.js: repulsion between all
+nodes approximated with a quadtree, springs along the edges, a central gravity and velocity
+damping. The quadtree is rebuilt every step from the Morton codes of the nodes and traversed
+level by level, for small buckets of nearby nodes at once.
+'''
+import numpy
+
+# the vis.js defaults, used when the network does not set the solver parameters
+DEFAULTS = {
+    'barnesHut': dict(gravity=-2000, central_gravity=0.3, spring_length=95, spring_strength=0.04,
+                      damping=0.09, overlap=0),
+    'forceAtlas2Based': dict(gravity=-50, central_gravity=0.01, spring_length=100, spring_strength=0.08,
+                             damping=0.4, overlap=0),
+}
+
+# pyvis parameter names of the vis.js solver options
+_OPTION_NAMES = {'gravitationalConstant': 'gravity', 'centralGravity': 'central_gravity',
+                 'springLength': 'spring_length', 'springConstant': 'spring_strength',
+                 'damping': 'damping', 'avoidOverlap': 'overlap'}
+
+
+def _spread(v):
+    '''
+    Interleaves the bits of 16 bit integers with zeros
+    '''
+    v = v.astype(numpy.uint64)
+    v = (v | (v << numpy.uint64(8))) & numpy.uint64(0x00FF00FF)
+    v = (v | (v << numpy.uint64(4))) & numpy.uint64(0x0F0F0F0F)
+    v = (v | (v << numpy.uint64(2))) & numpy.uint64(0x33333333)
+    v = (v | (v << numpy.uint64(1))) & numpy.uint64(0x55555555)
+    return v
+
+
+def _quadtree(positions, mass, depth):
+    '''
+    Quadtree over the nodes sorted by Morton code. Returns the sort order, the size of the root
+    cell and, for every level, the sorted keys of the occupied cells, their first node in sort
+    order, number of nodes, mass, center of mass and the range of their children cells.
+    '''
+    low = positions.min(axis=0)
+    size = max(float((positions.max(axis=0) - low).max()), 1e-9) * (1 + 1e-9)
+    cells = numpy.minimum(((positions - low) / size * 2 ** depth).astype(numpy.int64), 2 ** depth - 1)
+    codes = (_spread(cells[:, 0]) << numpy.uint64(1)) | _spread(cells[:, 1])
+    order = numpy.argsort(codes, kind='stable')
+    sorted_codes = codes[order]
+    weights = numpy.column_stack([mass, mass[:, None] * positions])[order]
+    levels = []
+    for level in range(depth + 1):
+        keys = sorted_codes >> numpy.uint64(2 * (depth - level))
+        starts = numpy.flatnonzero(numpy.r_[True, keys[1:] != keys[:-1]])
+        sums = numpy.add.reduceat(weights, starts)
+        levels.append({
+            'keys': keys[starts], 'starts': starts, 'counts': numpy.diff(numpy.r_[starts, len(keys)]),
+            'mass': sums[:, 0], 'x': sums[:, 1] / sums[:, 0], 'y': sums[:, 2] / sums[:, 0],
+        })
+    for level, below in zip(levels[:-1], levels[1:]):
+        first = level['keys'] << numpy.uint64(2)
+        level['first'] = numpy.searchsorted(below['keys'], first)
+        level['stop'] = numpy.searchsorted(below['keys'], first + numpy.uint64(4))
+    return order, size, levels
+
+
+def _ranges(first, count):
+    '''
+    The positions first[k] to first[k] + count[k] - 1 for all k, with the k of each position
+    '''
+    owner = numpy.repeat(numpy.arange(len(count)), count)
+    return owner, numpy.repeat(first - numpy.cumsum(count) + count, count) + numpy.arange(count.sum())
+
+
+def _children(pairs, cells, level):
+    '''
+    Replaces every (pair, cell) by one (pair, child) per child cell
+    '''
+    first = level['first'][cells]
+    owner, children = _ranges(first, level['stop'][cells] - first)
+    return pairs[owner], children
+
+
+def _blocks(first_a, count_a, first_b, count_b):
+    '''
+    All (a, b) pairs of nodes of blocks a and b of consecutive nodes
+    '''
+    count = count_a * count_b
+    k = numpy.arange(count.sum()) - numpy.repeat(numpy.cumsum(count) - count, count)
+    width = numpy.repeat(count_b, count)
+    return numpy.repeat(first_a, count) + k // width, numpy.repeat(first_b, count) + k % width
+
+
+def _buckets(levels, depth, bucket):
+    '''
+    The largest cells with at most bucket nodes, as arrays of their level, key, first node,
+    number of nodes and center of mass
+    '''
+    found = []
+    cells = numpy.zeros(1, dtype=numpy.int64)
+    for depth_, level in enumerate(levels):
+        leaf = (level['counts'][cells] <= bucket) | (depth_ == depth)
+        c = cells[leaf]
+        found.append((numpy.full(len(c), depth_), level['keys'][c], level['starts'][c], level['counts'][c],
+                      level['x'][c], level['y'][c]))
+        if leaf.all():
+            break
+        _, cells = _children(cells[~leaf], cells[~leaf], level)
+    return [numpy.concatenate(column) for column in zip(*found)]
+
+
+def _repulsion(positions, mass, factor, radius, gravity, exponent, theta, overlap, depth, bucket=16):
+    '''
+    Barnes-Hut approximation of the repulsion between all nodes, gravity * mass * factor
+    * other mass * delta / distance ** exponent, with delta the vector to the other mass.
+    Nodes are grouped in buckets of at most bucket nodes that walk the tree together while
+    cells are far enough to act on the center of mass of the whole bucket. Other cells are
+    handed over to the nodes of the bucket, which continue the walk one by one with the
+    vis.js criterion. The nodes of a bucket act on each other directly.
+    '''
+    n = len(positions)
+    order, size, levels = _quadtree(positions, mass, depth)
+    px, py = positions[order, 0], positions[order, 1]
+    sm, sr, sf = mass[order], radius[order], factor[order]
+    avoid = 1 - min(max(overlap, 0), 1)
+
+    def pull(dx, dy, distance, r):
+        # like vis.js, coinciding nodes are pushed apart along x
+        zero = distance < 1e-9
+        dx, distance = numpy.where(zero, 0.1, dx), numpy.where(zero, 0.1, distance)
+        if avoid < 1:
+            distance = numpy.maximum(0.1 + avoid * r, distance - r)
+        return dx, dy, distance ** -exponent
+
+    def add(out, at, dx, dy, distance, r, other_mass):
+        fx, fy, scale = pull(dx, dy, distance, r)
+        scale *= other_mass
+        out[:, 0] += numpy.bincount(at, fx * scale, minlength=len(out))
+        out[:, 1] += numpy.bincount(at, fy * scale, minlength=len(out))
+
+    b_level, b_key, b_first, b_count, b_x, b_y = _buckets(levels, depth, bucket)
+    node_bucket = numpy.repeat(numpy.arange(len(b_key)), b_count)
+    b_spread = numpy.maximum.reduceat(numpy.hypot(px - b_x[node_bucket], py - b_y[node_bucket]), b_first)
+    b_radius = numpy.maximum.reduceat(sr, b_first)
+
+    forces = numpy.zeros((n, 2))
+    bucket_forces = numpy.zeros((len(b_key), 2))
+    i, j = _blocks(b_first, b_count, b_first, b_count)
+    i, j = i[i != j], j[i != j]
+    add(forces, i, px[j] - px[i], py[j] - py[i], numpy.hypot(px[j] - px[i], py[j] - py[i]), sr[i], sm[j])
+
+    pairs = numpy.arange(len(b_key))
+    cells = numpy.zeros(len(b_key), dtype=numpy.int64)
+    nodes = node_cells = numpy.empty(0, dtype=numpy.int64)
+    for depth_, level in enumerate(levels):
+        width = size / 2 ** depth_
+        # cells containing a bucket are split until they are the bucket itself
+        shift = (b_level[pairs] - depth_).astype(numpy.uint64) * numpy.uint64(2)
+        inside = (b_key[pairs] >> shift) == level['keys'][cells]
+        dx, dy = level['x'][cells] - b_x[pairs], level['y'][cells] - b_y[pairs]
+        distance = numpy.hypot(dx, dy)
+        spread = b_spread[pairs]
+        far = ~inside & (width < theta * (distance - spread)) & (spread < theta * distance)
+        add(bucket_forces, pairs[far], dx[far], dy[far], distance[far], b_radius[pairs[far]],
+            level['mass'][cells[far]])
+
+        handed = ~inside & ~far
+        owner, first = _ranges(b_first[pairs[handed]], b_count[pairs[handed]])
+        nodes = numpy.concatenate([nodes, first])
+        node_cells = numpy.concatenate([node_cells, cells[handed][owner]])
+        dx, dy = level['x'][node_cells] - px[nodes], level['y'][node_cells] - py[nodes]
+        distance = numpy.hypot(dx, dy)
+        done = (width < theta * distance) | (level['counts'][node_cells] == 1) | (depth_ == depth)
+        add(forces, nodes[done], dx[done], dy[done], distance[done], sr[nodes[done]],
+            level['mass'][node_cells[done]])
+
+        split = inside & (b_level[pairs] > depth_)
+        if depth_ == depth or not (split.any() or (~done).any()):
+            break
+        pairs, cells = _children(pairs[split], cells[split], level)
+        nodes, node_cells = _children(nodes[~done], node_cells[~done], level)
+
+    forces += bucket_forces[node_bucket]
+    forces *= (gravity * sm * sf)[:, None]
+    out = numpy.empty_like(forces)
+    out[order] = forces
+    return out
+
+
+def force_layout(sources, targets, num_nodes, solver='barnesHut', gravity=None, central_gravity=None,
+                 spring_length=None, spring_strength=None, damping=None, overlap=None, radius=25.0,
+                 mass=1.0, iterations=1000, timestep=0.5, min_velocity=0.1, max_velocity=50.0,
+                 theta=0.5, depth=16, seed=None):
+    '''
+    Positions of the nodes after simulating the vis.js physics until the nodes come to rest
+    @param sources, targets positions of the edge ends
+    @param num_nodes        number of nodes
+    @param solver           'barnesHut' or 'forceAtlas2Based', parameters left as None take
+                            the vis.js defaults of the solver
+    @param radius           node radius used when overlap is not 0, scalar or per node
+    @param mass             node mass, scalar or per node
+    @param iterations       maximum number of simulation steps
+    @param min_velocity     stop once no node moves faster
+    @param theta            cells smaller than theta times their distance are approximated
+    @param depth            maximum depth of the quadtree
+    @return (num_nodes, 2) positions
+    '''
+    params = dict(DEFAULTS[solver])
+    given = dict(gravity=gravity, central_gravity=central_gravity, spring_length=spring_length,
+                 spring_strength=spring_strength, damping=damping, overlap=overlap)
+    params.update({name: value for name, value in given.items() if value is not None})
+    sources = numpy.asarray(sources, dtype=numpy.int64)
+    targets = numpy.asarray(targets, dtype=numpy.int64)
+    mass = numpy.broadcast_to(numpy.asarray(mass, dtype=float), (num_nodes,))
+    radius = numpy.broadcast_to(numpy.asarray(radius, dtype=float), (num_nodes,))
+    degree = numpy.bincount(numpy.r_[sources, targets], minlength=num_nodes).astype(float)
+    if solver == 'forceAtlas2Based':
+        exponent, factor, central = 2, numpy.maximum(degree, 1), (degree + 1) * mass
+    else:
+        exponent, factor, central = 3, numpy.ones(num_nodes), None
+
+    # like vis.js, nodes start on a circle whose radius grows with their number
+    rng = numpy.random.default_rng(seed)
+    angles = rng.uniform(0, 2 * numpy.pi, num_nodes)
+    positions = (num_nodes + 10.0) * numpy.column_stack([numpy.cos(angles), numpy.sin(angles)])
+    velocities = numpy.zeros_like(positions)
+    if num_nodes < 2:
+        return numpy.zeros((num_nodes, 2))
+
+    for _ in range(iterations):
+        forces = _repulsion(positions, mass, factor, radius, params['gravity'], exponent, theta,
+                            params['overlap'], depth)
+
+        distance = numpy.hypot(positions[:, 0], positions[:, 1])
+        if central is None:
+            forces -= positions * (params['central_gravity'] / numpy.where(distance > 0, distance, numpy.inf))[:, None]
+        else:
+            forces -= positions * (params['central_gravity'] * central)[:, None]
+
+        delta = positions[sources] - positions[targets]
+        length = numpy.maximum(numpy.hypot(delta[:, 0], delta[:, 1]), 0.01)
+        spring = delta * (params['spring_strength'] * (params['spring_length'] - length) / length)[:, None]
+        for axis in range(2):
+            forces[:, axis] += numpy.bincount(sources, spring[:, axis], minlength=num_nodes)
+            forces[:, axis] -= numpy.bincount(targets, spring[:, axis], minlength=num_nodes)
+
+        velocities += (forces - params['damping'] * velocities) / mass[:, None] * timestep
+        numpy.clip(velocities, -max_velocity, max_velocity, out=velocities)
+        positions += velocities * timestep
+        if numpy.hypot(velocities[:, 0], velocities[:, 1]).max() < min_velocity:
+            break
+    return positions
+
+
+def physics_params(net):
+    '''
+    (solver, parameters) of the physics options of a pyvis Network
+    '''
+    physics = net.options.physics
+    solver = getattr(physics, 'solver', 'barnesHut')
+    options = getattr(physics, solver, None)
+    if solver not in DEFAULTS:
+        raise ValueError('no layout for the {} solver'.format(solver))
+    params = dict(DEFAULTS[solver])
+    if options is not None and not isinstance(options, type):
+        params.update({_OPTION_NAMES[name]: value for name, value in vars(options).items()
+                       if name in _OPTION_NAMES})
+    return solver, params
+
+
+def _node_radius(frame):
+    '''
+    Node radius as drawn by vis.js, from the size or the value scaled into [10, 30]
+    '''
+    for name in ['size', 'value']:
+        if name in frame.node_attrs:
+            values = numpy.array([numpy.nan if v is None else float(v) for v in frame.node_attrs[name]])
+            if name == 'size':
+                return numpy.where(numpy.isnan(values), 25.0, values)
+            low, high = numpy.nanmin(values), numpy.nanmax(values)
+            scaled = 0.5 if high == low else (values - low) / (high - low)
+            return numpy.where(numpy.isnan(values), 25.0, 10 + 20 * scaled)
+    return 25.0
+
+
+def fix_layout(frame, net, iterations=1000, seed=0, **params):
+    '''
+    Lays out a GraphFrame with the physics options of a pyvis Network, stores the positions as
+    the x and y node attributes and disables the physics of the network, so the page shows the
+    final layout right away
+    @param params overrides of the physics parameters
+    @return (nodes, 2) positions
+    '''
+    solver, options = physics_params(net)
+    options.update(params)
+    positions = force_layout(frame.sources, frame.targets, frame.num_nodes, solver, radius=_node_radius(frame),
+                             iterations=iterations, seed=seed, **options)
+    positions = numpy.round(positions, 1)
+    frame.set_node_attr('x', positions[:, 0])
+    frame.set_node_attr('y', positions[:, 1])
+    net.toggle_physics(False)
+    return positions
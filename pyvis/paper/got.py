@@ -1,33 +1,33 @@
+import os
+import sys
+
 from pyvis.network import Network
 import pandas as pd
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from helpers.graph_frame import GraphFrame
+from helpers.compact import show_compact
+from helpers.layout import fix_layout
+
 got_net = Network(height="750px", width="100%", bgcolor="#222222", font_color="white")
 
 # set the physics layout of the network
 got_net.barnes_hut()
 got_data = pd.read_csv("stormofswords.csv")
 
-sources = got_data['Source']
-targets = got_data['Target']
-weights = got_data['Weight']
-
-edge_data = zip(sources, targets, weights)
+# adds both ends of every edge as nodes and the edges, weighted by the Weight column
+got_frame = GraphFrame.from_edge_frame(got_data, source='Source', target='Target', weight='Weight')
 
-for e in edge_data:
-    src = e[0]
-    dst = e[1]
-    w = e[2]
-
-    got_net.add_node(src, src, title=src)
-    got_net.add_node(dst, dst, title=dst)
-    got_net.add_edge(src, dst, value=w)
-
-neighbor_map = got_net.get_adj_list()
+adjacency = got_frame.adjacency()
 
 # add neighbor data to node hover data
-for node in got_net.nodes:
-    node["title"] += " Neighbors:<br>" + "<br>".join(neighbor_map[node["id"]])
-    node["value"] = len(neighbor_map[node["id"]])
+got_frame.set_node_attr("title", got_frame.ids.astype(str) + " Neighbors:<br>" + adjacency.neighbor_titles())
+got_frame.set_node_attr("value", adjacency.degrees)
+
+# run the physics here and write the final positions, the page opens already laid out
+fix_layout(got_frame, got_net)
 
-print(len(got_net.nodes))
-got_net.show("gameofthrones.html")
\ No newline at end of file
+print(got_frame.num_nodes)
+# columns with shared strings instead of one JSON object per node and edge, pass sidecar=True
+# (and compress=True) to move the data of large graphs to a separate file served with the page
+show_compact(got_frame, got_net, "gameofthrones.html", sidecar=False)
@@ -1,11 +1,38 @@
 import numpy
+
+
+def encode_binary(labels, n, dtype=numpy.uint8):
+    '''
+    Converts integer labels into n-bit binary vectors, most significant bit first
+    @param labels an integer or an array of N integers
+    @param n      number of bits to use (or target dimension)
+    @param dtype  type of the output, e.g. numpy.uint8 or numpy.float32
+    @return an (n,) vector for a single label, otherwise an (N, n) matrix
+    '''
+    labels = numpy.asarray(labels, dtype=numpy.int64)
+    shifts = numpy.arange(n - 1, -1, -1, dtype=numpy.int64)
+    return ((labels[..., None] >> shifts) & 1).astype(dtype)
+
+
+def decode_binary(bits, threshold=0.5):
+    '''
+    Converts n-bit binary vectors, most significant bit first, back into integer labels
+    @param bits      an (n,) vector or an (N, n) matrix, values from threshold up count as 1
+    @param threshold cut off for real valued bits such as model outputs
+    '''
+    bits = numpy.asarray(bits)
+    n = bits.shape[-1]
+    weights = numpy.left_shift(1, numpy.arange(n - 1, -1, -1, dtype=numpy.int64))
+    return (bits >= threshold) @ weights
+
+
 def binary(n):
     '''
-    Function factory which creates a function which converts a number into an n-bit binary vector
+    Function factory which creates a function which converts a number into an n-bit binary vector,
+    or an array of numbers into a matrix of them
     @param n  number of bits to use (or target dimension)
     '''
     def func(x):
-        return numpy.array([int(d) for d in format(x, "0{n}b".format(n=4))],
-                           dtype=numpy.uint8)
+        return encode_binary(x, n)
 
     return func
@@ -1,34 +1,48 @@
-import itertools
+import os
+import sys
+
 import numpy as np
-import math
 
-def random_vectors(k, n):
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from helpers import coherence
+
+def seed_streams(seed, streams):
+    '''
+    Spawn independent seed sequences from one seed, e.g. one per process, so that each
+    process can generate its own disjoint and reproducible set of candidates
+    @param seed    integer seed or numpy.random.SeedSequence
+    @param streams number of streams
+    '''
+    if not isinstance(seed, np.random.SeedSequence):
+        seed = np.random.SeedSequence(seed)
+    return seed.spawn(streams)
+
+
+def random_vectors(k, n, seed=None, dtype=np.float64):
     '''
     Generate a random number of n-dimensional orthonormal vectors uniformly on a hypersphere
     Exploit method of Muller mentioned in this blog under method #3
     http://extremelearning.com.au/how-to-generate-uniformly-random-points-on-n-spheres-and-n-balls/
     @param k number of vectors
     @param n dimension of the vector
-    '''
-    vectors = []
-    for _ in range(k):
-        v = np.random.normal(size=n)
-        norm = np.linalg.norm(v)
-        if norm > 0.0:
-            vectors.append(list(v / norm))
+    @param seed anything numpy.random.default_rng accepts, e.g. one of seed_streams
+    @param dtype numpy.float32 or numpy.float64
+    '''
+    vectors = np.random.default_rng(seed).standard_normal((k, n), dtype=dtype)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    nonzero = norms[:, 0] > 0.0
+    if not nonzero.all():
+        vectors, norms = vectors[nonzero], norms[nonzero]
+    vectors /= norms
     return vectors
-def abs_inner(x):
-    '''
-    Absolute Value of the inner product
-    '''
-    return np.abs(np.inner(*x))
-    
+
+
 def worst_dot(samples):
     '''
     Calculate the max pairwise dot product of a set of vectors
     @param samples The set of vectors
     '''
-    return max(map(abs_inner, itertools.combinations(samples, 2)))
+    return coherence.worst_dot(samples)
 
 
 def worst_angle(samples):
@@ -36,4 +50,4 @@ def worst_angle(samples):
     Calculate the minimum angle of a set of vectors in degrees
     @param samples The set of vectors
     '''
-    return math.acos(worst_dot(samples)) / math.pi * 180
\ No newline at end of file
+    return coherence.worst_angle(samples)
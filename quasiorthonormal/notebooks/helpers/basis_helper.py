@@ -1,34 +1,179 @@
+import io
 import itertools
+import math
+import os
+import re
 
 import numpy
 
+from .coherence import gram_tiles
 
-def dedup(x):
+# above this dimension the grid cells hold too many points and _antipodal_pairs searches the
+# Gram matrix tile by tile instead
+GRID_MAX_DIMENSION = 32
+
+
+def _antipodal_pairs_gram(x, epsilon, block_size=2048):
+    '''
+    Finds the same pairs as _antipodal_pairs from the Gram matrix, one tile at a time, using
+    |a + b|^2 = |a|^2 + |b|^2 + 2 a.b. Candidates get a small margin and are checked exactly.
+    '''
+    n = len(x)
+    squares = numpy.einsum('ij,ij->i', x, x)
+    margin = epsilon + 1e-9 * (1 + squares.max())
+    i, j = [], []
+    for i0, i1, j0, j1 in gram_tiles(n, block_size):
+        sums = squares[i0:i1, None] + squares[None, j0:j1] + 2 * (x[i0:i1] @ x[j0:j1].T)
+        rows, cols = numpy.nonzero(sums < margin)
+        rows, cols = rows + i0, cols + j0
+        # tiles cover the upper triangle, so the later index is the column
+        above = cols > rows
+        i.append(cols[above])
+        j.append(rows[above])
+    i, j = numpy.concatenate(i), numpy.concatenate(j)
+    total = x[i] + x[j]
+    close = numpy.einsum('ij,ij->i', total, total) < epsilon
+    pairs = numpy.unique(i[close] * n + j[close])
+    return numpy.stack([pairs // n, pairs % n], axis=1)
+
+
+def _antipodal_pairs(x, epsilon, chunk_size=2 ** 20):
+    '''
+    Finds all pairs (i, j), j < i, whose sum has a squared length below epsilon.
+
+    Vectors are quantized onto a randomly offset grid and each grid cell is hashed to a
+    single integer. Since every coordinate of an antipode lies within sqrt(epsilon) of the
+    negated vector, it is enough to look up the cell of the negated vector and the
+    neighbouring cells along coordinates that are closer than that to a cell boundary.
+    The candidates found this way are checked exactly. The cells have to grow with the
+    dimension, so beyond GRID_MAX_DIMENSION the Gram matrix is searched instead.
+    '''
+    n, d = x.shape
+    if d > GRID_MAX_DIMENSION:
+        return _antipodal_pairs_gram(x, epsilon)
+    radius = numpy.sqrt(epsilon)
+    # trades the number of probed cells, about e^(8/3), against the cell population
+    cell = radius * max(1.0, 0.75 * d)
+    rng = numpy.random.default_rng(0)
+    offset = rng.uniform(0, cell, size=d)
+    weights = rng.integers(1, 2 ** 63, size=d, dtype=numpy.int64).astype(numpy.uint64)
+
+    def cell_hash(key):
+        return (key.astype(numpy.uint64) * weights).sum(axis=1, dtype=numpy.uint64)
+
+    hashes = cell_hash(numpy.floor((x + offset) / cell).astype(numpy.int64))
+    order = numpy.argsort(hashes, kind='stable')
+    sorted_hashes = hashes[order]
+
+    target = (offset - x) / cell
+    floor = numpy.floor(target)
+    fraction = (target - floor) * cell
+    owner = numpy.arange(n)
+    probes = cell_hash(floor.astype(numpy.int64))
+    for k in range(d):
+        lower = fraction[owner, k] <= radius
+        upper = fraction[owner, k] >= cell - radius
+        owner = numpy.concatenate([owner, owner[lower], owner[upper]])
+        probes = numpy.concatenate([probes, probes[lower] - weights[k], probes[upper] + weights[k]])
+
+    lo = numpy.searchsorted(sorted_hashes, probes, side='left')
+    hi = numpy.searchsorted(sorted_hashes, probes, side='right')
+    counts = hi - lo
+    i = numpy.repeat(owner, counts)
+    j = order[numpy.repeat(lo, counts) + numpy.arange(counts.sum()) -
+              numpy.repeat(numpy.cumsum(counts) - counts, counts)]
+    earlier = j < i
+    i, j = i[earlier], j[earlier]
+    close = numpy.zeros(len(i), dtype=bool)
+    for start in range(0, len(i), chunk_size):
+        total = x[i[start:start + chunk_size]] + x[j[start:start + chunk_size]]
+        close[start:start + chunk_size] = numpy.einsum('ij,ij->i', total, total) < epsilon
+    pairs = numpy.unique(i[close] * n + j[close])
+    return numpy.stack([pairs // n, pairs % n], axis=1)
+
+
+def dedup(x, epsilon=0.001):
     '''
     This function removes antipodal points from a set of vectors. The constant epsilon
     is used as a threshold since due to round off error, some antipodal points might not
-    be exactly the negative of its counterpart
+    be exactly the negative of its counterpart. A vector is dropped when the squared length
+    of its sum with an earlier kept vector is below epsilon. Returns an ndarray.
     '''
+    x = numpy.asarray(x, dtype=numpy.float64)
+    if len(x) == 0:
+        return x
+    keep = numpy.ones(len(x), dtype=bool)
+    # pairs are sorted by the later index, so keep[j] is already final when i is visited
+    for i, j in _antipodal_pairs(x, epsilon).tolist():
+        if keep[j]:
+            keep[i] = False
+    return x[keep]
 
-    epsilon = 0.001
 
-    def is_neg(x, y):
-        sum = 0.0
-        for x0, y0 in zip(x, y):
-            sum += (x0 + y0) ** 2
-        return sum < epsilon
+def _sloane_shape(path):
+    '''
+    Reads the dimension and number of points out of a neilsloane.com file name such as
+    pack.3.12.txt or 24cell.4.24.txt, returns (None, None) when the name does not match
+    '''
+    match = re.search(r'\.(\d+)\.(\d+)(?:\.\d+)*\.txt$', os.path.basename(path))
+    if match is None:
+        return None, None
+    return int(match.group(1)), int(match.group(2))
 
-    def has_neg(x, list_):
-        for y in list_:
-            if is_neg(x, y):
-                return True
-        return False
 
-    out = []
-    for each in x:
-        if not has_neg(each, out):
-            out.append(each)
-    return out
+def parse_code(in_, dim=None, count=None, chunk_size=65536):
+    '''
+    This function streams sphere codes in the format of neilsloane.com into a float array of
+    shape (points, dim). The coordinates may be listed one per line or one point per line.
+    @param in_        text, list of lines or an open file
+    @param dim        dimension of the code, inferred from the first line when it holds a point
+    @param count      number of points if known, used to preallocate the output
+    @param chunk_size number of lines parsed at once
+    '''
+    if isinstance(in_, str):
+        in_ = io.StringIO(in_)
+    lines = iter(in_)
+    if dim is None:
+        first = next((l for l in lines if l.strip()), '')
+        dim = len(first.split())
+        if dim == 0:
+            return numpy.empty((0, 0), dtype=numpy.float64)
+        lines = itertools.chain([first], lines)
+    out = numpy.empty((count or 1024) * dim, dtype=numpy.float64)
+    filled = 0
+    while True:
+        chunk = ' '.join(itertools.islice(lines, chunk_size)).split()
+        if not chunk:
+            break
+        values = numpy.array(chunk, dtype=numpy.float64)
+        if filled + len(values) > len(out):
+            out = numpy.resize(out, max(2 * len(out), filled + len(values)))
+        out[filled:filled + len(values)] = values
+        filled += len(values)
+    if filled % dim:
+        raise ValueError('{} coordinates do not split into {}-dimensional points'.format(filled, dim))
+    return out[:filled].reshape(-1, dim)
+
+
+def load_code(path, dim=None, count=None, cache=True):
+    '''
+    This function loads a sphere code file from neilsloane.com. The parsed points are saved to
+    a sidecar .npy file next to it, which later loads memory-map instead of parsing again.
+    @param path  path of the text file
+    @param dim   dimension of the code, taken from the file name when omitted
+    @param count number of points, taken from the file name when omitted
+    @param cache read and write the sidecar file
+    '''
+    sidecar = path + '.npy'
+    if cache and os.path.exists(sidecar) and os.path.getmtime(sidecar) >= os.path.getmtime(path):
+        return numpy.load(sidecar, mmap_mode='r')
+    name_dim, name_count = _sloane_shape(path)
+    with open(path) as in_:
+        points = parse_code(in_, dim or name_dim, count or name_count)
+    if not cache:
+        return points
+    numpy.save(sidecar, points)
+    return numpy.load(sidecar, mmap_mode='r')
 
 
 def parse_basis(in_):
@@ -38,46 +183,88 @@ def parse_basis(in_):
     '''
     if type(in_) != list:
         in_ = in_.split('\n')
-    y = map(lambda x: x.strip().split(), in_)
-    return dedup([list(map(lambda x: float(x), l)) for l in y if l])
+    return dedup(parse_code(in_, count=len(in_)))
 
 
-def parse_sphere(in_):
+def parse_sphere(in_, dim=3):
     '''
     This function takes the sphere codes encoded in the format for neilsloane.com and parses
     out the file.
     '''
-    all = in_.strip().split('\n')
-    out = []
-    step = 3
-    for idx in range(0, len(all), step):
-        out.append([float(all[idx + i]) for i in range(0, step)])
-    return out
+    return parse_code(in_, dim)
 
 
-def normalize(vectors):
+def normalize(vectors, out=None, chunk_size=65536):
     ''' This normalizes a set of vectors so their length is 1
+    Floating point inputs keep their dtype, other inputs are converted to float64. Vectors of
+    length 0 stay 0. The rows are processed chunk_size at a time, so passing out=vectors
+    normalizes a large (e.g. memory-mapped) array in place in a single pass.
+    '''
+    vectors = numpy.asarray(vectors)
+    dtype = vectors.dtype if numpy.issubdtype(vectors.dtype, numpy.floating) else numpy.float64
+    if out is None:
+        out = numpy.empty(vectors.shape, dtype=dtype)
+    for start in range(0, len(vectors), chunk_size):
+        chunk = numpy.asarray(vectors[start:start + chunk_size], dtype=dtype)
+        norms = numpy.linalg.norm(chunk, axis=1, keepdims=True)
+        norms[norms == 0] = 1
+        numpy.divide(chunk, norms, out=out[start:start + chunk_size])
+    return out
+
+
+def _sign_patterns(rank):
+    '''
+    All 2^rank patterns of -1 and 1, pattern i has 1 in slot s when bit s of i is set
     '''
-    norms = numpy.apply_along_axis(numpy.linalg.norm, 1, vectors)
-    return (vectors.T / norms).T
+    bits = numpy.arange(2 ** rank)[:, None] >> numpy.arange(rank) & 1
+    return (2 * bits - 1).astype(numpy.int8)
 
 
-def hadamard(width, rank):
+def hadamard_indices(width, rank):
+    '''
+    The hadamard vectors in the same order as hadamard, but stored by their non-zero entries:
+    returns (indices, signs), two (vectors, rank) arrays holding the position and the sign
+    (-1 or 1) of every non-zero entry
+    '''
+    signs = _sign_patterns(rank)
+    combos = list(itertools.combinations(range(0, width), rank))
+    combos = numpy.array(combos, dtype=numpy.intp).reshape(len(combos), rank)
+    indices = numpy.repeat(combos, len(signs), axis=0)
+    return indices, numpy.tile(signs, (len(combos), 1))
+
+
+def hadamard_blocks(width, rank, block_size=65536, dtype=numpy.int8):
+    '''
+    This lazily enumerates the hadamard vectors in the same order as hadamard, yielding arrays
+    of at most block_size vectors (but at least 2^rank) so wide codes never have to be held
+    in memory at once
+    '''
+    signs = _sign_patterns(rank)
+    per_combo = len(signs)
+    combos_per_block = max(1, block_size // per_combo)
+    combos = itertools.combinations(range(0, width), rank)
+    while True:
+        chunk = numpy.array(list(itertools.islice(combos, combos_per_block)), dtype=numpy.intp)
+        if len(chunk) == 0:
+            return
+        block = numpy.zeros((len(chunk), per_combo, width), dtype=dtype)
+        rows = numpy.arange(len(chunk))[:, None, None]
+        patterns = numpy.arange(per_combo)[None, :, None]
+        block[rows, patterns, chunk.reshape(len(chunk), 1, rank)] = signs
+        yield block.reshape(-1, width)
+
+
+def hadamard(width, rank, dtype=numpy.int8):
     ''' This enumerates all hadamard vectors (vectors of -1, 0, and 1) the width represents
-    the total vector dimension, rank represents the number of non-zero entries per vector
-    '''
-
-    def vectorize(x):
-        output = []
-        for each in range(0, 2 ** rank):
-            out = [0] * width
-            for slot in range(0, rank):
-                out[x[slot]] = 1 if each >> slot & 1 else -1
-            output.append(out)
-        return output
-
-    combo = itertools.combinations(range(0, width), rank)
-    out = []
-    for each in map(vectorize, combo):
-        out += each
+    the total vector dimension, rank represents the number of non-zero entries per vector.
+    Returns a (C(width, rank) * 2^rank, width) array
+    '''
+    combos = 0
+    if 0 <= rank <= width:
+        combos = math.factorial(width) // math.factorial(rank) // math.factorial(width - rank)
+    out = numpy.empty((combos * 2 ** rank, width), dtype=dtype)
+    filled = 0
+    for block in hadamard_blocks(width, rank, dtype=dtype):
+        out[filled:filled + len(block)] = block
+        filled += len(block)
     return out
@@ -0,0 +1,98 @@
+'''
+Builds quasiorthonormal bases of any size by spreading k unit vectors in n dimensions so that the
+worst pairwise absolute dot product becomes small. The vectors repel each other through the
+energy sum |<x_i, x_j>|^power, whose gradient is followed on the sphere for the whole batch
+at once. A large power makes the energy dominated by the worst pairs.
+'''
+import numpy
+
+
+def welch_bound(k, n):
+    '''
+    Lower bound on the worst absolute dot product of k unit vectors in n dimensions
+    '''
+    if k <= n:
+        return 0.0
+    return float(numpy.sqrt((k - n) / (n * (k - 1))))
+
+
+def _odd_power(x, power):
+    '''
+    Computes x^(power - 1) for an even power by repeated squaring, keeping the sign of x
+    '''
+    squared = x * x
+    out = x
+    exponent = power // 2 - 1
+    while exponent:
+        if exponent & 1:
+            out = out * squared
+        exponent >>= 1
+        if exponent:
+            squared = squared * squared
+    return out
+
+
+def _repulsion(x, power, block_size):
+    '''
+    Returns the energy gradient and the current worst absolute dot product, computed over
+    row blocks of the Gram matrix
+    '''
+    grad = numpy.empty_like(x)
+    worst = 0.0
+    for start in range(0, len(x), block_size):
+        gram = x[start:start + block_size] @ x.T
+        rows = numpy.arange(len(gram))
+        gram[rows, rows + start] = 0
+        worst = max(worst, gram.max(), -gram.min())
+        grad[start:start + block_size] = _odd_power(gram, power) @ x
+    return grad, float(worst)
+
+
+def optimize_basis(k, n, initial=None, iterations=1000, power=16, step=0.05, decay=0.998,
+                   tol=1e-7, patience=100, block_size=4096, seed=None, dtype=numpy.float64):
+    '''
+    Minimizes the worst pairwise absolute dot product of k unit vectors in n dimensions.
+    Returns the best basis found as a (k, n) array together with the history of the worst
+    absolute dot product per iteration.
+    @param initial    starting vectors, random ones are drawn when omitted
+    @param iterations maximum number of gradient steps
+    @param power      even exponent of the repulsion energy, at least 2
+    @param step       largest angle (in radians) any vector moves in the first step
+    @param decay      factor applied to the step after every iteration
+    @param tol        improvement of the worst dot product that resets the patience counter
+    @param patience   number of iterations without such improvement before stopping
+    @param block_size number of Gram matrix rows computed at once
+    @param seed       seed of the random starting vectors
+    @param dtype      numpy.float32 or numpy.float64
+    '''
+    if power < 2 or power % 2:
+        raise ValueError('power must be an even number of at least 2')
+    if initial is None:
+        x = numpy.random.default_rng(seed).standard_normal((k, n), dtype=dtype)
+    else:
+        x = numpy.array(initial, dtype=dtype).reshape(k, n)
+    x /= numpy.linalg.norm(x, axis=1, keepdims=True)
+
+    best, best_worst = x.copy(), numpy.inf
+    history = []
+    stale = 0
+    for _ in range(iterations):
+        grad, worst = _repulsion(x, power, block_size)
+        history.append(worst)
+        if worst < best_worst - tol:
+            stale = 0
+        else:
+            stale += 1
+        if worst < best_worst:
+            best, best_worst = x.copy(), worst
+        if stale >= patience:
+            break
+        # keep only the component tangent to the sphere
+        grad -= numpy.sum(grad * x, axis=1, keepdims=True) * x
+        largest = numpy.linalg.norm(grad, axis=1).max()
+        if largest == 0:
+            break
+        x -= (step / largest) * grad
+        x /= numpy.linalg.norm(x, axis=1, keepdims=True)
+        step *= decay
+    return best, history
@@ -0,0 +1,111 @@
+'''
+Local registry of sphere codes so the notebooks and training jobs do not need to download and
+parse them from neilsloane.com on every run. The notebooks load with download=True, so a missing
+code is fetched once on first use. Codes are keyed by (dimension, count, family), where
+count and family follow the file names on neilsloane.com, e.g. (4, 24, '24cell') for
+24cell.4.24.txt. They are stored normalized as .npy files and loaded memory-mapped.
+
+For offline nodes, populate the registry on a machine with network access with
+
+    python -m helpers.basis_registry
+
+and copy the directory (QO_BASIS_DIR, ~/.cache/quasiorthonormal by default) to offline nodes.
+'''
+import argparse
+import functools
+import os
+import urllib.request
+
+import numpy
+
+from .basis_helper import dedup, normalize, parse_code
+
+SLOANE_URL = 'http://neilsloane.com/packings/dim{dimension}/{family}.{dimension}.{count}.txt'
+
+# families made of antipodal pairs, only one point of each pair is kept as a basis vector
+ANTIPODAL_FAMILIES = {'24cell', 'E6', 'E7', 'E8'}
+
+# the codes used by the notebooks
+NOTEBOOK_CODES = [(3, 12, 'pack'), (4, 24, '24cell'), (7, 56, 'E7')]
+
+
+def registry_dir(root=None):
+    '''
+    Directory holding the registry, taken from QO_BASIS_DIR when root is not given
+    '''
+    if root is None:
+        root = os.environ.get('QO_BASIS_DIR',
+                              os.path.join(os.path.expanduser('~'), '.cache', 'quasiorthonormal'))
+    return root
+
+
+def basis_path(dimension, count, family='pack', root=None):
+    '''
+    Path of the stored basis for a key
+    '''
+    return os.path.join(registry_dir(root), '{}.{}.{}.npy'.format(family, dimension, count))
+
+
+def register(points, dimension, count, family='pack', root=None):
+    '''
+    Normalizes a code and stores it in the registry. Antipodal points are removed for the
+    families listed in ANTIPODAL_FAMILIES. Returns the path of the stored file.
+    @param points (count, dimension) array of code points
+    '''
+    points = numpy.asarray(points, dtype=numpy.float64).reshape(-1, dimension)
+    if family in ANTIPODAL_FAMILIES:
+        points = dedup(points)
+    path = basis_path(dimension, count, family, root)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    numpy.save(path, normalize(points).astype(numpy.float32))
+    _load.cache_clear()
+    return path
+
+
+def fetch(dimension, count, family='pack', root=None):
+    '''
+    Downloads a code from neilsloane.com and stores it in the registry. Only the first count
+    points of the file are used since some files carry trailing notes.
+    '''
+    url = SLOANE_URL.format(dimension=dimension, count=count, family=family)
+    with urllib.request.urlopen(url) as response:
+        lines = response.read().decode().split('\n')
+    lines = [l for l in lines if l.strip()]
+    per_line = len(lines[0].split())
+    points = parse_code(lines[:count * dimension // per_line], dimension, count)
+    return register(points, dimension, count, family, root)
+
+
+@functools.lru_cache(maxsize=32)
+def _load(path):
+    return numpy.load(path, mmap_mode='r')
+
+
+def load_basis(dimension, count, family='pack', classes=None, root=None, download=False):
+    '''
+    Returns a stored basis as a read-only float32 array of unit vectors. Loaded bases are kept
+    in a bounded in-process cache.
+    @param classes  number of basis vectors to return, all of them when omitted
+    @param download fetch the code from neilsloane.com when it is not in the registry
+    '''
+    path = basis_path(dimension, count, family, root)
+    if not os.path.exists(path):
+        if not download:
+            raise FileNotFoundError(
+                'no {}.{}.{} code in {}, fetch it first with python -m helpers.basis_registry'.format(
+                    family, dimension, count, registry_dir(root)))
+        fetch(dimension, count, family, root)
+    return _load(path)[:classes]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Download sphere codes into the basis registry')
+    parser.add_argument('--root', help='registry directory')
+    parser.add_argument('codes', nargs='*', metavar='DIMENSION.COUNT.FAMILY',
+                        help='codes to fetch, defaults to the ones used by the notebooks')
+    args = parser.parse_args()
+    codes = NOTEBOOK_CODES
+    if args.codes:
+        codes = [(int(d), int(c), f) for d, c, f in (code.split('.', 2) for code in args.codes)]
+    for code in codes:
+        print(fetch(*code, root=args.root))
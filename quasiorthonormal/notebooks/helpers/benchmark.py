@@ -0,0 +1,229 @@
+'''
+Benchmark of the qsoftmax implementations against a plain one-hot softmax over the same number of
+classes. Every combination of backend, encoding, batch size, code dimension and number of classes
+is timed and the results are written as JSON, e.g.
+
+    python -m helpers.benchmark --output benchmark.json
+
+Backends whose library is not installed are skipped. Latencies are timed without any memory
+tracing. Memory is measured in a separate pass that runs each configuration in a fresh process
+and reads its resident size from /proc (Linux only), which covers the NumPy, TensorFlow and
+PyTorch allocators alike: peak_rss_bytes is the peak of the child process, call_rss_bytes how far
+the calls raised it above the resident size right after setup.
+'''
+import argparse
+import concurrent.futures
+import importlib.util
+import json
+import multiprocessing
+import os
+import platform
+import time
+
+import numpy
+
+DIMENSIONS = [3, 4, 5, 7, 16, 64]
+CLASSES = [10, 100, 1000]
+BATCH_SIZES = [1, 32, 1024, 32768]
+
+
+def _numpy_runner(basis, x, onehot):
+    from .np_qsoftmax import qsoftmax, softmax
+    if onehot:
+        return lambda: softmax(x)
+    func = qsoftmax(basis, dtype=numpy.float32)
+    return lambda: func(x)
+
+
+def _tensorflow_runner(basis, x, onehot):
+    import tensorflow as tf
+    from .tf_qsoftmax import QSoftmax
+    layer = tf.nn.softmax if onehot else QSoftmax(basis)
+    x = tf.constant(x)
+    func = tf.function(layer)
+    # like the torch runner, the result stays a tensor of the backend
+    return lambda: func(x)
+
+
+def _torch_runner(basis, x, onehot):
+    import torch
+    from .pt_qsoftmax import QSoftmax
+    module = torch.nn.Softmax(dim=-1) if onehot else QSoftmax(basis)
+    x = torch.from_numpy(x)
+
+    def run():
+        with torch.inference_mode():
+            return module(x)
+
+    return run
+
+
+BACKENDS = {
+    'numpy': ('numpy', _numpy_runner),
+    'tensorflow': ('tensorflow', _tensorflow_runner),
+    'torch': ('torch', _torch_runner),
+}
+
+
+def available_backends():
+    '''
+    Names of the backends whose library is installed, found without importing it so that the
+    parent of the memory pass stays small
+    '''
+    return [name for name, (module, _) in BACKENDS.items() if importlib.util.find_spec(module)]
+
+
+def measure(run, repeats=50, warmup=5):
+    '''
+    Times repeated calls of run, returning the latencies in seconds
+    '''
+    for _ in range(warmup):
+        run()
+    latencies = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        run()
+        latencies.append(time.perf_counter() - start)
+    return numpy.array(latencies)
+
+
+def _status(field):
+    '''
+    Size in bytes of a field of /proc/self/status such as VmRSS or VmHWM, None if unavailable
+    '''
+    try:
+        with open('/proc/self/status') as in_:
+            for line in in_:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def _reset_peak():
+    '''
+    Resets VmHWM to the current resident size, returns False when the kernel does not allow it
+    '''
+    try:
+        with open('/proc/self/clear_refs', 'w') as out:
+            out.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def _setup(backend, encoding, batch, dimension, classes, seed):
+    '''
+    Returns the dimension actually used and the runner of a configuration
+    '''
+    rng = numpy.random.default_rng(seed)
+    onehot = encoding == 'onehot'
+    if onehot:
+        dimension = classes
+    basis = rng.standard_normal((classes, dimension)).astype(numpy.float32)
+    basis /= numpy.linalg.norm(basis, axis=1, keepdims=True)
+    x = rng.standard_normal((batch, dimension)).astype(numpy.float32)
+    return dimension, BACKENDS[backend][1](basis, x, onehot)
+
+
+def _memory(backend, encoding, batch, dimension, classes, repeats, warmup, seed):
+    '''
+    Runs one configuration in the current, fresh process and returns its resident sizes
+    '''
+    _, run = _setup(backend, encoding, batch, dimension, classes, seed)
+    for _ in range(warmup):
+        run()
+    # VmHWM starts over at exec, unlike ru_maxrss which a spawned child inherits from its parent
+    setup_peak = _status('VmHWM')
+    reset = _reset_peak()
+    before = _status('VmRSS')
+    for _ in range(repeats):
+        run()
+    peak = _status('VmHWM')
+    if peak is None or before is None:
+        return {'peak_rss_bytes': None, 'call_rss_bytes': None}
+    return {'peak_rss_bytes': max(peak, setup_peak),
+            'call_rss_bytes': peak - before if reset else max(0, peak - max(before, setup_peak))}
+
+
+def measure_memory(backend, encoding, batch, dimension, classes, repeats=5, warmup=2, seed=0):
+    '''
+    Resident memory of one configuration, measured in a fresh process so that earlier
+    configurations and the timing pass do not raise the peak
+    '''
+    context = multiprocessing.get_context('spawn')
+    with concurrent.futures.ProcessPoolExecutor(1, mp_context=context) as executor:
+        return executor.submit(_memory, backend, encoding, batch, dimension, classes,
+                               repeats, warmup, seed).result()
+
+
+def benchmark(backend, encoding, batch, dimension, classes, repeats=50, warmup=5, seed=0, memory=True):
+    '''
+    Benchmarks one configuration and returns its results as a dictionary
+    @param encoding 'qsoftmax' for a (classes, dimension) basis or 'onehot' for a plain softmax
+    @param memory   also measure the resident memory, in a separate process
+    '''
+    used, run = _setup(backend, encoding, batch, dimension, classes, seed)
+    latencies = measure(run, repeats, warmup)
+    result = {
+        'backend': backend,
+        'encoding': encoding,
+        'batch': batch,
+        'dimension': used,
+        'classes': classes,
+        'throughput': batch / latencies.mean(),
+        'latency_ms': {'p{}'.format(q): float(numpy.percentile(latencies, q) * 1000) for q in (50, 90, 99)},
+    }
+    if memory:
+        result.update(measure_memory(backend, encoding, batch, dimension, classes, seed=seed))
+    return result
+
+
+def sweep(backends=None, batch_sizes=BATCH_SIZES, dimensions=DIMENSIONS, classes=CLASSES, repeats=50,
+          memory=True):
+    '''
+    Runs every configuration, the one-hot baseline is run once per backend, batch size and
+    number of classes
+    '''
+    results = []
+    for backend in backends or available_backends():
+        for batch in batch_sizes:
+            for count in classes:
+                results.append(benchmark(backend, 'onehot', batch, None, count, repeats, memory=memory))
+                for dimension in dimensions:
+                    results.append(benchmark(backend, 'qsoftmax', batch, dimension, count, repeats,
+                                             memory=memory))
+    return {
+        'environment': {
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'cpus': os.cpu_count(),
+            'numpy': numpy.__version__,
+        },
+        'results': results,
+    }
+
+
+def _ints(text):
+    return [int(each) for each in text.split(',')]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the qsoftmax backends')
+    parser.add_argument('--backends', type=lambda text: text.split(','), default=None,
+                        help='comma separated backends, all installed ones by default')
+    parser.add_argument('--batch-sizes', type=_ints, default=BATCH_SIZES)
+    parser.add_argument('--dimensions', type=_ints, default=DIMENSIONS)
+    parser.add_argument('--classes', type=_ints, default=CLASSES)
+    parser.add_argument('--repeats', type=int, default=50)
+    parser.add_argument('--no-memory', action='store_true', help='skip the memory pass')
+    parser.add_argument('--output', help='JSON file to write, stdout by default')
+    args = parser.parse_args()
+    report = sweep(args.backends, args.batch_sizes, args.dimensions, args.classes, args.repeats,
+                   not args.no_memory)
+    if args.output:
+        with open(args.output, 'w') as out:
+            json.dump(report, out, indent=1)
+    else:
+        print(json.dumps(report, indent=1))
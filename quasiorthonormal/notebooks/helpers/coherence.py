@@ -0,0 +1,164 @@
+'''
+Pairwise dot product metrics of a set of vectors computed tile by tile over the Gram matrix, so
+the memory used stays bounded by the block size no matter how many vectors there are
+'''
+import concurrent.futures
+import math
+
+import numpy
+
+
+def gram_tiles(n, block_size):
+    '''
+    Enumerates the tiles (i0, i1, j0, j1) covering the upper triangle of an n x n Gram matrix
+    '''
+    for i0 in range(0, n, block_size):
+        for j0 in range(i0, n, block_size):
+            yield i0, min(i0 + block_size, n), j0, min(j0 + block_size, n)
+
+
+def gram_tile(vectors, tile):
+    '''
+    Computes one tile of the Gram matrix. On diagonal tiles only the entries above the diagonal
+    are returned, flattened, so every pair is seen exactly once
+    '''
+    i0, i1, j0, j1 = tile
+    block = vectors[i0:i1] @ vectors[j0:j1].T
+    if i0 == j0:
+        return block[numpy.triu_indices(i1 - i0, 1)]
+    return block.ravel()
+
+
+def map_tiles(func, vectors, block_size=2048, workers=1):
+    '''
+    Applies func(vectors, tile) to every tile of the Gram matrix, using a thread pool when more
+    than one worker is requested (the matrix products release the GIL). Returns an iterator
+    over the results.
+    '''
+    vectors = numpy.asarray(vectors)
+    tiles = gram_tiles(len(vectors), block_size)
+    if workers == 1:
+        return (func(vectors, tile) for tile in tiles)
+    executor = concurrent.futures.ThreadPoolExecutor(workers)
+    results = executor.map(lambda tile: func(vectors, tile), tiles)
+    executor.shutdown(wait=False)
+    return results
+
+
+def _tile_worst_dot(vectors, tile):
+    products = gram_tile(vectors, tile)
+    if len(products) == 0:
+        return 0.0
+    return max(products.max(), -products.min())
+
+
+def worst_dot(vectors, block_size=2048, workers=1):
+    '''
+    Calculate the max absolute pairwise dot product of a set of vectors
+    @param vectors    the set of vectors
+    @param block_size number of vectors per side of a Gram matrix tile
+    @param workers    number of threads working on tiles
+    '''
+    if len(vectors) < 2:
+        raise ValueError('at least two vectors are needed')
+    return float(max(map_tiles(_tile_worst_dot, vectors, block_size, workers)))
+
+
+def worst_angle(vectors, block_size=2048, workers=1):
+    '''
+    Calculate the minimum angle of a set of unit vectors in degrees
+    @param vectors    the set of vectors
+    @param block_size number of vectors per side of a Gram matrix tile
+    @param workers    number of threads working on tiles
+    '''
+    return math.acos(min(1.0, worst_dot(vectors, block_size, workers))) / math.pi * 180
+
+
+class AngleHistogram:
+    '''
+    Histogram of pairwise angles in degrees over fixed, equally wide bins. Partial histograms,
+    e.g. of different Gram matrix tiles, are combined with merge.
+    @param bins     number of bins
+    @param absolute use the angle between lines, from |dot|, which ranges over [0, 90]
+                    instead of [0, 180]
+    '''
+
+    def __init__(self, bins=180, absolute=False):
+        self.bins = bins
+        self.absolute = absolute
+        self.top = 90.0 if absolute else 180.0
+        self.counts = numpy.zeros(bins, dtype=numpy.int64)
+        self.min = math.inf
+        self.max = -math.inf
+
+    @property
+    def edges(self):
+        return numpy.linspace(0.0, self.top, self.bins + 1)
+
+    def update(self, dots):
+        '''
+        Adds the angles of an array of dot products of unit vectors
+        '''
+        dots = numpy.abs(dots) if self.absolute else numpy.asarray(dots)
+        if len(dots) == 0:
+            return self
+        angles = numpy.degrees(numpy.arccos(numpy.clip(dots, -1, 1)))
+        index = numpy.minimum((angles * (self.bins / self.top)).astype(numpy.intp), self.bins - 1)
+        self.counts += numpy.bincount(index, minlength=self.bins)
+        self.min = min(self.min, float(angles.min()))
+        self.max = max(self.max, float(angles.max()))
+        return self
+
+    def merge(self, other):
+        '''
+        Adds the counts of another histogram with the same bins
+        '''
+        if (other.bins, other.absolute) != (self.bins, self.absolute):
+            raise ValueError('histograms with different bins cannot be merged')
+        self.counts += other.counts
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+
+def angle_histogram(vectors, bins=180, absolute=False, block_size=2048, workers=1):
+    '''
+    Histogram of all pairwise angles of a set of unit vectors, accumulated tile by tile
+    @param vectors    the set of vectors
+    @param bins       number of bins
+    @param absolute   histogram the angles between lines instead of vectors
+    @param block_size number of vectors per side of a Gram matrix tile
+    @param workers    number of threads working on tiles
+    '''
+    def tile_histogram(vectors, tile):
+        return AngleHistogram(bins, absolute).update(gram_tile(vectors, tile))
+
+    out = AngleHistogram(bins, absolute)
+    for partial in map_tiles(tile_histogram, vectors, block_size, workers):
+        out.merge(partial)
+    return out
+
+
+def angle_report(histogram, percentiles=(1, 5, 50, 95, 99)):
+    '''
+    Summary of an angle histogram as a dictionary. Means and percentiles are taken at bin
+    resolution, from the bin centers.
+    '''
+    edges = histogram.edges
+    centers = (edges[:-1] + edges[1:]) / 2
+    pairs = int(histogram.counts.sum())
+    report = {
+        'pairs': pairs,
+        'min_angle': histogram.min,
+        'max_angle': histogram.max,
+        'bin_width': float(edges[1] - edges[0]),
+        'counts': histogram.counts.tolist(),
+    }
+    if pairs:
+        cumulative = numpy.cumsum(histogram.counts)
+        report['mean_angle'] = float(centers @ histogram.counts / pairs)
+        report['percentiles'] = {
+            'p{}'.format(q): float(centers[numpy.searchsorted(cumulative, q / 100 * pairs)])
+            for q in percentiles
+        }
+    return report
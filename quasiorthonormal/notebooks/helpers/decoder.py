@@ -0,0 +1,72 @@
+'''
+Decoding of quasiorthonormal model outputs at serving time. The class of an activation vector is
+the basis vector with the largest projection, so a whole batch is decoded with one matrix product
+and a partial sort; exponentials are only computed when probabilities are asked for.
+'''
+import collections
+
+import numpy
+
+Decoded = collections.namedtuple('Decoded', ['labels', 'scores', 'margins', 'probabilities'])
+Decoded.__doc__ = '''
+Result of a decode. labels and scores are (batch, k) arrays ordered from best to worst, margins
+is the (batch,) gap between the best and the second best score, and probabilities is the
+(batch, k) softmax probability of the labels or None when not requested.
+'''
+
+
+def _logsumexp(scores):
+    shift = scores.max(axis=1, keepdims=True)
+    return numpy.log(numpy.exp(scores - shift).sum(axis=1)) + shift[:, 0]
+
+
+def decoder(basis, dtype=numpy.float32):
+    '''
+    Decoder metafunction. It returns a function decoding (batch, d) activations for the given
+    basis, which is converted and transposed only once.
+    @param basis (classes, d) array of code vectors
+    @param dtype floating point type of the projection
+    '''
+    projection = numpy.ascontiguousarray(numpy.asarray(basis, dtype=dtype).T)
+    classes = projection.shape[1]
+
+    def func(x, k=1, probabilities=False):
+        '''
+        @param x             (batch, d) activations, a single (d,) vector is treated as a batch of one
+        @param k             number of best classes to return
+        @param probabilities also return the softmax probabilities of the returned classes
+        '''
+        if k < 1:
+            raise ValueError('k must be at least 1')
+        x = numpy.atleast_2d(numpy.asarray(x, dtype=dtype))
+        scores = x @ projection
+        rows = numpy.arange(len(scores))[:, None]
+        k = min(k, classes)
+        if k == 1:
+            labels = scores.argmax(axis=1)[:, None]
+        else:
+            labels = numpy.argpartition(-scores, k - 1, axis=1)[:, :k]
+            labels = numpy.take_along_axis(
+                labels, numpy.argsort(-scores[rows, labels], axis=1, kind='stable'), axis=1)
+        top = scores[rows, labels]
+        probs = None
+        if probabilities:
+            probs = numpy.exp(top - _logsumexp(scores)[:, None])
+        if classes == 1:
+            margins = numpy.full(len(scores), numpy.inf, dtype=scores.dtype)
+        elif k > 1:
+            margins = top[:, 0] - top[:, 1]
+        else:
+            # the best scores are no longer needed in place, mask them to find the runners up
+            scores[rows, labels] = -numpy.inf
+            margins = top[:, 0] - scores.max(axis=1)
+        return Decoded(labels, top, margins, probs)
+
+    return func
+
+
+def decode(x, basis, k=1, probabilities=False):
+    '''
+    Decodes (batch, d) activations for the given basis, see decoder
+    '''
+    return decoder(basis)(x, k, probabilities)
@@ -0,0 +1,128 @@
+'''
+MNIST input pipeline shared by the notebooks. The images stay uint8, optionally memory-mapped from
+local .npy files, and are only converted to float32 in [0, 1] one batch at a time, instead of
+keeping a float64 copy of the whole dataset alive for the entire run.
+'''
+import os
+import queue
+import tempfile
+import threading
+
+import numpy
+
+SPLITS = ['x_train', 'y_train', 'x_test', 'y_test']
+
+
+def data_dir(root=None):
+    '''
+    Directory holding the .npy files, taken from QO_DATA_DIR when root is not given
+    '''
+    if root is None:
+        root = os.environ.get('QO_DATA_DIR',
+                              os.path.join(os.path.expanduser('~'), '.cache', 'quasiorthonormal', 'mnist'))
+    return root
+
+
+def load_mnist(root=None, mmap=True):
+    '''
+    Returns (x_train, y_train), (x_test, y_test) as uint8 arrays. The first call downloads the
+    dataset through tf.keras and stores it as .npy files, later calls memory-map those. Each file
+    is written to a temporary name and then renamed, so an interrupted download never leaves a
+    truncated file behind.
+    @param root directory of the .npy files
+    @param mmap memory-map the files instead of reading them into memory
+    '''
+    paths = [os.path.join(data_dir(root), split + '.npy') for split in SPLITS]
+    if not all(os.path.exists(path) for path in paths):
+        import tensorflow as tf
+        (x_train, y_train), (x_test, y_test) = tf.keras.datasets.mnist.load_data()
+        os.makedirs(data_dir(root), exist_ok=True)
+        for path, array in zip(paths, [x_train, y_train, x_test, y_test]):
+            with tempfile.NamedTemporaryFile(dir=data_dir(root), suffix='.npy', delete=False) as out:
+                numpy.save(out, array)
+            os.replace(out.name, path)
+    x_train, y_train, x_test, y_test = [numpy.load(path, mmap_mode='r' if mmap else None) for path in paths]
+    return (x_train, y_train), (x_test, y_test)
+
+
+def scale(x):
+    '''
+    Converts a batch of uint8 images to float32 values in [0, 1]
+    '''
+    return numpy.multiply(x, numpy.float32(1 / 255.0), dtype=numpy.float32)
+
+
+def _batch_indices(n, batch_size, shuffle, rng):
+    order = rng.permutation(n) if shuffle else numpy.arange(n)
+    for start in range(0, n, batch_size):
+        # sorted indices read memory-mapped files front to back
+        yield numpy.sort(order[start:start + batch_size]) if shuffle else order[start:start + batch_size]
+
+
+def batches(x, y, batch_size=32, shuffle=True, epochs=1, prefetch=2, seed=None):
+    '''
+    Generator of (float32 images, labels) batches, prepared by a background thread that stays
+    up to prefetch batches ahead. Pass epochs=None to loop forever, e.g. for Model.fit with
+    steps_per_epoch.
+    @param x uint8 images
+    @param y labels
+    '''
+    rng = numpy.random.default_rng(seed)
+    batches_ = queue.Queue(maxsize=prefetch)
+    stop = threading.Event()
+    done = object()
+
+    def put(item):
+        # gives up once the consumer is gone instead of blocking on a full queue forever
+        while not stop.is_set():
+            try:
+                batches_.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce():
+        epoch = 0
+        while epochs is None or epoch < epochs:
+            for index in _batch_indices(len(x), batch_size, shuffle, rng):
+                if not put((scale(x[index]), numpy.asarray(y[index]))):
+                    return
+            epoch += 1
+        put(done)
+
+    threading.Thread(target=produce, daemon=True).start()
+    try:
+        while True:
+            batch = batches_.get()
+            if batch is done:
+                return
+            yield batch
+    finally:
+        stop.set()
+
+
+def dataset(x, y, batch_size=32, shuffle=True, seed=None):
+    '''
+    tf.data pipeline over uint8 images that shuffles and batches indices only, then reads and
+    scales each batch from x and y, so memory-mapped arrays are never loaded as a whole
+    @param x uint8 images
+    @param y labels
+    '''
+    import tensorflow as tf
+
+    def gather(index):
+        index = numpy.sort(index)
+        return scale(x[index]), numpy.asarray(y[index])
+
+    def read(index):
+        images, labels = tf.numpy_function(gather, [index], [tf.float32, tf.as_dtype(y.dtype)])
+        images.set_shape((None,) + tuple(x.shape[1:]))
+        labels.set_shape((None,) + tuple(y.shape[1:]))
+        return images, labels
+
+    data = tf.data.Dataset.range(len(x))
+    if shuffle:
+        data = data.shuffle(len(x), seed=seed, reshuffle_each_iteration=True)
+    data = data.batch(batch_size).map(read, num_parallel_calls=tf.data.AUTOTUNE)
+    return data.prefetch(tf.data.AUTOTUNE)
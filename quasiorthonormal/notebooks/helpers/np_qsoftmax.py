@@ -1,18 +1,157 @@
 import numpy as np
 #from scipy.special.softmax as softmax
 
-def softmax(x):
-        ex=np.exp(x)
-        return ex/np.sum(ex)
-        
-def f_qsoftmax(x, basis):                                                                           
-        qx = np.matmul(np.asarray(basis),x)                                                           
-        return softmax(qx)                                                                            
-                                                                                                      
-                                                                                 
-
-def qsoftmax(basis):
-        def func(x):
-            qx = np.matmul(np.asarray(basis),x)
-            return softmax(qx)
-        return func
+
+def _logsumexp(x):
+    '''
+    Max-shifted log-sum-exp over the last axis, keeping that axis
+    '''
+    shift = np.max(x, axis=-1, keepdims=True)
+    ex = np.exp(x - shift)
+    return np.log(np.sum(ex, axis=-1, keepdims=True)) + shift
+
+
+def softmax(x, out=None):
+    '''
+    Softmax over the last axis, so a (batch, classes) array is handled row by row. The logits
+    are shifted by their maximum before exponentiating so large values do not overflow
+    @param x   logits
+    @param out optional buffer of the same shape, may be x itself
+    '''
+    out = np.subtract(x, np.max(x, axis=-1, keepdims=True), out=out)
+    np.exp(out, out=out)
+    out /= np.sum(out, axis=-1, keepdims=True)
+    return out
+
+
+def log_softmax(x, out=None):
+    '''
+    Logarithm of the softmax over the last axis computed as x - logsumexp(x)
+    @param x   logits
+    @param out optional buffer of the same shape, may be x itself
+    '''
+    return np.subtract(x, _logsumexp(x), out=out)
+
+
+def _project(x, basis, out=None):
+    '''
+    Projects a (d,) vector or a (batch, d) array onto the basis, giving (classes,) or
+    (batch, classes) logits
+    '''
+    return np.matmul(x, basis.T, out=out)
+
+
+def f_qsoftmax(x, basis, out=None):
+    '''
+    Quasiorthogonal softmax of a single (d,) vector or a (batch, d) array of vectors
+    @param x     activations
+    @param basis (classes, d) array of code vectors
+    @param out   optional (batch, classes) buffer for the result
+    '''
+    return softmax(_project(x, np.asarray(basis), out=out), out=out)
+
+
+def log_qsoftmax(x, basis, out=None):
+    '''
+    Logarithm of the quasiorthogonal softmax, computed without materializing probabilities
+    @param x     activations
+    @param basis (classes, d) array of code vectors
+    @param out   optional (batch, classes) buffer for the result
+    '''
+    return log_softmax(_project(x, np.asarray(basis), out=out), out=out)
+
+
+def _chunks(basis, chunk_size):
+    '''
+    Yields (offset, rows) blocks of the basis, a memory-mapped basis is read block by block
+    '''
+    for start in range(0, len(basis), chunk_size):
+        yield start, np.asarray(basis[start:start + chunk_size])
+
+
+def _streaming_logsumexp(x, basis, chunk_size, visit=None):
+    '''
+    Log-sum-exp of x @ basis.T over the classes, computed block by block with a running
+    maximum and a running sum of exponentials. visit(offset, logits) sees every block.
+    '''
+    dtype = np.result_type(x.dtype, basis.dtype)
+    shift = np.full(len(x), -np.inf, dtype=dtype)
+    total = np.zeros(len(x), dtype=dtype)
+    for start, rows in _chunks(basis, chunk_size):
+        qx = _project(x, rows)
+        if visit is not None:
+            visit(start, qx)
+        new_shift = np.maximum(shift, qx.max(axis=1))
+        total = total * np.exp(shift - new_shift) + np.exp(qx - new_shift[:, None]).sum(axis=1)
+        shift = new_shift
+    return np.log(total) + shift
+
+
+def qsoftmax_nll(x, basis, labels, chunk_size=None):
+    '''
+    Negative log-likelihood of the labels under the quasiorthogonal softmax. The whole batch
+    is scored with a single matrix product and a log-sum-exp
+    @param x          (batch, d) activations
+    @param basis      (classes, d) array of code vectors
+    @param labels     (batch,) integer class labels
+    @param chunk_size stream the basis in blocks of this many classes so that only
+                      (batch, chunk_size) logits exist at a time, for very large label spaces
+    '''
+    x = np.atleast_2d(x)
+    # a memmap only gets an ndarray view, _chunks still reads it block by block
+    basis = np.asarray(basis)
+    labels = np.asarray(labels).reshape(-1)
+    if chunk_size is None:
+        qx = _project(x, basis)
+        return _logsumexp(qx)[:, 0] - qx[np.arange(len(qx)), labels]
+    target = np.einsum('ij,ij->i', x, np.asarray(basis[labels]))
+    return _streaming_logsumexp(x, basis, chunk_size) - target
+
+
+def qsoftmax_topk(x, basis, k=1, chunk_size=65536):
+    '''
+    The k most likely classes and their log-probabilities under the quasiorthogonal softmax,
+    streaming the basis in blocks so that memory stays bounded for very large label spaces
+    @param x          (batch, d) activations
+    @param basis      (classes, d) array of code vectors
+    @param k          number of classes to return
+    @param chunk_size number of classes projected at a time
+    @return (batch, k) labels and (batch, k) log-probabilities, best first
+    '''
+    x = np.atleast_2d(x)
+    basis = np.asarray(basis)
+    rows = np.arange(len(x))[:, None]
+    best_scores = np.empty((len(x), 0), dtype=np.result_type(x.dtype, basis.dtype))
+    best_labels = np.empty((len(x), 0), dtype=np.intp)
+
+    def visit(start, qx):
+        nonlocal best_scores, best_labels
+        labels = np.broadcast_to(np.arange(start, start + qx.shape[1]), qx.shape)
+        best_scores = np.concatenate([best_scores, qx], axis=1)
+        best_labels = np.concatenate([best_labels, labels], axis=1)
+        if best_scores.shape[1] > k:
+            keep = np.argpartition(-best_scores, k - 1, axis=1)[:, :k]
+            best_scores, best_labels = best_scores[rows, keep], best_labels[rows, keep]
+
+    lse = _streaming_logsumexp(x, basis, chunk_size, visit)
+    order = np.argsort(-best_scores, axis=1, kind='stable')
+    return best_labels[rows, order], best_scores[rows, order] - lse[:, None]
+
+
+def qsoftmax(basis, dtype=None, log=False):
+    '''
+    Quasiorthogonal softmax metafunction. It returns a quasiorthogonal softmax function for
+    the given basis. The basis is converted only once, to dtype if given (e.g. numpy.float32),
+    and inputs are cast to the same dtype
+    @param basis (classes, d) array of code vectors
+    @param dtype optional floating point type of the computation
+    @param log   return log-probabilities instead of probabilities
+    '''
+    basis = np.ascontiguousarray(basis, dtype=dtype)
+    activation = log_softmax if log else softmax
+
+    def func(x, out=None):
+        x = np.asarray(x, dtype=basis.dtype if dtype is not None else None)
+        return activation(_project(x, basis, out=out), out=out)
+
+    return func
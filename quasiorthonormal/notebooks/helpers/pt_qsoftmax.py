@@ -1,6 +1,36 @@
 import torch
 
+
 def qsoftmax(x, basis):
-       qx = torch.mm(torch.tensor(basis),
-                     x.unsqueeze(0).t()).t().squeeze()
-       return torch.nn.functional.softmax(qx,dim=0)
+    '''
+    Quasiorthogonal softmax of a single (d,) vector or a (batch, d) tensor of vectors
+    '''
+    basis = torch.as_tensor(basis, dtype=x.dtype, device=x.device)
+    return torch.nn.functional.softmax(torch.matmul(x, basis.t()), dim=-1)
+
+
+class QSoftmax(torch.nn.Module):
+    '''
+    Quasiorthogonal softmax layer. The basis is registered once as a buffer, so it follows the
+    module across devices and into its state dict, and (batch, d) inputs are projected with a
+    single matmul. The module can be scripted with torch.jit.script or compiled.
+    @param basis (classes, d) array or tensor of code vectors
+    @param log   return log-probabilities computed with log_softmax instead of probabilities
+    '''
+
+    def __init__(self, basis, log=False):
+        super().__init__()
+        basis = torch.as_tensor(basis)
+        if not basis.is_floating_point():
+            basis = basis.to(torch.get_default_dtype())
+        self.register_buffer('basis', basis.detach().clone().contiguous())
+        self.log = log
+
+    def forward(self, x):
+        qx = torch.matmul(x, self.basis.to(x.dtype).t())
+        if self.log:
+            return torch.nn.functional.log_softmax(qx, dim=-1)
+        return torch.nn.functional.softmax(qx, dim=-1)
+
+    def extra_repr(self):
+        return 'classes={}, dimension={}, log={}'.format(self.basis.shape[0], self.basis.shape[1], self.log)
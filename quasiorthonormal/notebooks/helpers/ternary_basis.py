@@ -0,0 +1,95 @@
+'''
+Structured representation of ternary bases such as the hadamard codes, whose vectors have only
+rank non-zero entries of -1 or 1. Only the positions and signs of those entries are stored, and
+projections gather the matching activations and add them up, so their cost grows with the rank
+instead of the width of the code.
+'''
+import numpy
+
+from .basis_helper import hadamard_indices
+from .np_qsoftmax import log_softmax, softmax
+
+
+class TernaryBasis:
+    '''
+    A basis of vectors with rank non-zero entries of equal magnitude
+    @param indices (classes, rank) positions of the non-zero entries
+    @param signs   (classes, rank) signs of the non-zero entries
+    @param width   dimension of the vectors
+    @param scale   magnitude of the non-zero entries, 1/sqrt(rank) gives unit vectors
+    '''
+
+    def __init__(self, indices, signs, width, scale=1.0):
+        self.indices = numpy.asarray(indices, dtype=numpy.intp)
+        self.signs = numpy.asarray(signs, dtype=numpy.int8)
+        self.width = width
+        self.scale = scale
+
+    @classmethod
+    def hadamard(cls, width, rank, normalized=True):
+        '''
+        The basis of basis_helper.hadamard(width, rank), normalized to unit vectors by default
+        '''
+        indices, signs = hadamard_indices(width, rank)
+        return cls(indices, signs, width, 1 / numpy.sqrt(rank) if normalized and rank else 1.0)
+
+    @classmethod
+    def from_dense(cls, basis, atol=1e-6):
+        '''
+        Builds the structured form of a dense basis whose rows all have the same number of
+        non-zero entries, all of the same magnitude
+        '''
+        basis = numpy.asarray(basis)
+        nonzero = numpy.abs(basis) > atol
+        rank = nonzero.sum(axis=1)
+        if len(basis) and (rank != rank[0]).any():
+            raise ValueError('all basis vectors need the same number of non-zero entries')
+        rank = int(rank[0]) if len(basis) else 0
+        # stable sort keeps the non-zero positions of each row in increasing order
+        indices = numpy.argsort(~nonzero, axis=1, kind='stable')[:, :rank]
+        values = numpy.take_along_axis(basis, indices, axis=1)
+        scale = float(numpy.abs(values).max()) if values.size else 1.0
+        if not numpy.allclose(numpy.abs(values), scale, atol=atol):
+            raise ValueError('all non-zero entries need the same magnitude')
+        return cls(indices, numpy.sign(values), basis.shape[1], scale)
+
+    def __len__(self):
+        return len(self.indices)
+
+    @property
+    def rank(self):
+        return self.indices.shape[1]
+
+    def to_dense(self, dtype=numpy.float32):
+        '''
+        Returns the (classes, width) dense basis
+        '''
+        out = numpy.zeros((len(self), self.width), dtype=dtype)
+        numpy.put_along_axis(out, self.indices, self.signs * dtype(self.scale), axis=1)
+        return out
+
+    def project(self, x):
+        '''
+        Projects a (d,) vector or a (batch, d) array onto the basis, equal to x @ basis.T
+        '''
+        x = numpy.asarray(x)
+        # gathering whole rows of the transposed input keeps the memory access contiguous
+        xt = numpy.ascontiguousarray(x.T)
+        dtype = numpy.result_type(x.dtype, numpy.float32)
+        out = numpy.zeros((len(self),) + x.shape[:-1], dtype=dtype)
+        gathered = numpy.empty_like(out)
+        signs = self.signs.astype(dtype).reshape(self.signs.shape + (1,) * (x.ndim - 1))
+        for slot in range(self.rank):
+            numpy.take(xt, self.indices[:, slot], axis=0, out=gathered)
+            gathered *= signs[:, slot]
+            out += gathered
+        if self.scale != 1.0:
+            out *= out.dtype.type(self.scale)
+        return out.T
+
+    def qsoftmax(self, x, log=False):
+        '''
+        Quasiorthogonal softmax (or its logarithm) of x with this basis
+        '''
+        qx = self.project(x)
+        return log_softmax(qx, out=qx) if log else softmax(qx, out=qx)
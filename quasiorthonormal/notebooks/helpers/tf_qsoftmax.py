@@ -1,16 +1,129 @@
+import numpy
 import tensorflow as tf
+
+
 def f_qsoftmax(x, basis):
-        qx = tf.matmul(tf.constant(basis), x,
-                       transpose_b=True)
-        return tf.nn.softmax(tf.transpose(qx))
+        qx = tf.matmul(x, tf.constant(basis), transpose_b=True)
+        return tf.nn.softmax(qx)
 
 def qsoftmax(basis):
     '''
     Quasiorthogonal softmax metafunction. It returns a quasiorthogonal softmax function for the given basis
     '''
+    basis = tf.constant(basis)
 
     def func(x):
-        qx = tf.matmul(tf.constant(basis), x, transpose_b=True)
-        return tf.nn.softmax(tf.transpose(qx))
+        qx = tf.matmul(x, basis, transpose_b=True)
+        return tf.nn.softmax(qx)
 
     return func
+
+
+@tf.keras.utils.register_keras_serializable(package='quasiorthonormal')
+class QSoftmax(tf.keras.layers.Layer):
+    '''
+    Quasiorthogonal softmax layer. The basis is held as a non-trainable weight and the input is
+    projected with a single x @ basis.T, so the layer can be saved, reloaded and XLA compiled.
+    Under a mixed precision policy the projection runs in the compute dtype; pass
+    dtype='float32' to keep the softmax itself in full precision.
+    @param basis (classes, d) array of code vectors
+    @param log   return log-probabilities instead of probabilities
+    '''
+
+    def __init__(self, basis, log=False, **kwargs):
+        super().__init__(**kwargs)
+        self.basis_value = numpy.asarray(basis, dtype=numpy.float32)
+        self.log = log
+
+    def build(self, input_shape):
+        self.basis = self.add_weight(name='basis',
+                                     shape=self.basis_value.shape,
+                                     initializer=tf.keras.initializers.Constant(self.basis_value),
+                                     trainable=False)
+        super().build(input_shape)
+
+    def call(self, inputs):
+        qx = tf.matmul(inputs, tf.cast(self.basis, inputs.dtype), transpose_b=True)
+        if self.log:
+            return tf.nn.log_softmax(qx)
+        return tf.nn.softmax(qx)
+
+    def compute_output_shape(self, input_shape):
+        return tuple(input_shape[:-1]) + (self.basis_value.shape[0],)
+
+    def get_config(self):
+        config = super().get_config()
+        config.update(basis=self.basis_value.tolist(), log=self.log)
+        return config
+
+
+def qsoftmax_sparse_crossentropy(labels, x, basis):
+    '''
+    Sparse categorical crossentropy of the quasiorthogonal softmax computed directly from the
+    activations x before the projection, as logsumexp(x @ basis.T) - (x @ basis.T)[label].
+    The probabilities are never materialized in the forward pass and only x is kept for the
+    backward pass, which recomputes the projection.
+    @param labels (batch,) integer class labels
+    @param x      (batch, d) activations
+    @param basis  (classes, d) array of code vectors
+    '''
+    basis = tf.convert_to_tensor(basis, dtype=tf.float32)
+    labels = tf.reshape(tf.cast(labels, tf.int32), [-1])
+    x = tf.cast(x, tf.float32)
+
+    @tf.custom_gradient
+    def crossentropy(x):
+        logits = tf.matmul(x, basis, transpose_b=True)
+        target = tf.gather(logits, labels, axis=1, batch_dims=1)
+
+        def grad(upstream):
+            logits = tf.matmul(x, basis, transpose_b=True)
+            delta = tf.nn.softmax(logits) - tf.one_hot(labels, tf.shape(basis)[0])
+            return tf.matmul(upstream[:, None] * delta, basis)
+
+        return tf.reduce_logsumexp(logits, axis=-1) - target, grad
+
+    return crossentropy(x)
+
+
+@tf.keras.utils.register_keras_serializable(package='quasiorthonormal')
+class QSoftmaxCrossentropy(tf.keras.losses.Loss):
+    '''
+    Keras loss wrapping qsoftmax_sparse_crossentropy, for models whose last layer is the
+    Dense(d) projection input instead of a QSoftmax layer
+    @param basis (classes, d) array of code vectors
+    '''
+
+    def __init__(self, basis, name='qsoftmax_crossentropy', **kwargs):
+        super().__init__(name=name, **kwargs)
+        self.basis_value = numpy.asarray(basis, dtype=numpy.float32)
+
+    def call(self, y_true, y_pred):
+        return qsoftmax_sparse_crossentropy(y_true, y_pred, self.basis_value)
+
+    def get_config(self):
+        config = super().get_config()
+        config.update(basis=self.basis_value.tolist())
+        return config
+
+
+@tf.keras.utils.register_keras_serializable(package='quasiorthonormal')
+class QSoftmaxAccuracy(tf.keras.metrics.SparseCategoricalAccuracy):
+    '''
+    Accuracy for models trained with QSoftmaxCrossentropy, the predicted class is the basis
+    vector with the largest projection of the activations
+    @param basis (classes, d) array of code vectors
+    '''
+
+    def __init__(self, basis, name='accuracy', **kwargs):
+        super().__init__(name=name, **kwargs)
+        self.basis_value = numpy.asarray(basis, dtype=numpy.float32)
+
+    def update_state(self, y_true, y_pred, sample_weight=None):
+        logits = tf.matmul(tf.cast(y_pred, tf.float32), self.basis_value, transpose_b=True)
+        return super().update_state(y_true, logits, sample_weight)
+
+    def get_config(self):
+        config = super().get_config()
+        config.update(basis=self.basis_value.tolist())
+        return config
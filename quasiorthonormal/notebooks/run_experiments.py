@@ -0,0 +1,174 @@
+'''
+Runs the MNIST experiments of the reference, qo and sp notebooks outside of Jupyter. The
+configurations are plain data, experiments run in a process pool with a fixed number of threads
+per process, and results are cached by a hash of the configuration and the basis so that
+unchanged experiments are skipped on rerun.
+
+    python run_experiments.py --workers 3 --threads 2
+    python run_experiments.py qo4 sp3 --epochs 5
+'''
+import argparse
+import concurrent.futures
+import hashlib
+import json
+import multiprocessing
+import os
+import time
+
+import numpy
+
+from helpers.basis_helper import hadamard, normalize
+from helpers.basis_registry import load_basis
+
+COMMON = {'hidden': 64, 'dropout': 0.2, 'epochs': 20, 'batch_size': 32, 'seed': 0}
+
+# basis is None for the plain softmax reference, otherwise it says how to build the basis
+EXPERIMENTS = {
+    'reference': dict(COMMON, basis=None),
+    'reference_lambda': dict(COMMON, basis={'kind': 'identity', 'size': 10}),
+    'qo4': dict(COMMON, basis={'kind': 'registry', 'dimension': 4, 'count': 24, 'family': '24cell'}),
+    'qo7': dict(COMMON, basis={'kind': 'registry', 'dimension': 7, 'count': 56, 'family': 'E7'}),
+    'sp3': dict(COMMON, basis={'kind': 'registry', 'dimension': 3, 'count': 12, 'family': 'pack'}),
+    'sp5': dict(COMMON, basis={'kind': 'hadamard', 'width': 5, 'rank': 1}),
+}
+
+CLASSES = 10
+
+
+def build_basis(spec):
+    '''
+    Builds the float32 basis described by an experiment, None for the plain softmax
+    '''
+    if spec is None:
+        return None
+    if spec['kind'] == 'identity':
+        return numpy.identity(spec['size'], dtype=numpy.float32)
+    if spec['kind'] == 'registry':
+        return numpy.array(load_basis(spec['dimension'], spec['count'], spec['family'], classes=CLASSES,
+                                       download=True))
+    if spec['kind'] == 'hadamard':
+        return normalize(hadamard(spec['width'], spec['rank']).astype(numpy.float32))[:CLASSES]
+    raise ValueError('unknown basis kind {}'.format(spec['kind']))
+
+
+def config_hash(config, basis):
+    '''
+    Hash identifying the results of a configuration with a given basis
+    '''
+    digest = hashlib.sha256(json.dumps(config, sort_keys=True).encode())
+    if basis is not None:
+        digest.update(numpy.ascontiguousarray(basis, dtype=numpy.float32).tobytes())
+    return digest.hexdigest()[:16]
+
+
+THREAD_VARIABLES = ['OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS']
+
+
+def _limit_threads(threads):
+    '''
+    Process pool initializer, fixes the TensorFlow thread pools before it starts its runtime. The
+    BLAS libraries read their limits when numpy is imported, which a spawned worker does before
+    the initializer runs, so those come from the environment set by run_all
+    '''
+    import tensorflow as tf
+    tf.config.threading.set_intra_op_parallelism_threads(threads)
+    tf.config.threading.set_inter_op_parallelism_threads(1)
+
+
+def run_experiment(name, config, basis):
+    '''
+    Trains one model and returns its training history
+    '''
+    import tensorflow as tf
+    from helpers.mnist_data import dataset, load_mnist
+    from helpers.tf_qsoftmax import QSoftmax
+
+    tf.keras.utils.set_random_seed(config['seed'])
+    (x_train, y_train), (x_test, y_test) = load_mnist()
+    layers = [
+        tf.keras.layers.Flatten(input_shape=(28, 28)),
+        tf.keras.layers.Dense(config['hidden'], activation=tf.nn.relu),
+        tf.keras.layers.Dropout(config['dropout']),
+    ]
+    if basis is None:
+        layers.append(tf.keras.layers.Dense(CLASSES, activation=tf.nn.softmax))
+    else:
+        layers += [tf.keras.layers.Dense(basis.shape[1]), QSoftmax(basis)]
+    model = tf.keras.models.Sequential(layers)
+    model.compile(optimizer='adam', loss='sparse_categorical_crossentropy', metrics=['accuracy'])
+    start = time.time()
+    history = model.fit(dataset(x_train, y_train, config['batch_size'], seed=config['seed']),
+                        epochs=config['epochs'],
+                        validation_data=dataset(x_test, y_test, config['batch_size'], shuffle=False),
+                        verbose=0)
+    return {
+        'name': name,
+        'config': config,
+        'seconds': time.time() - start,
+        'history': {key: [float(each) for each in values] for key, values in history.history.items()},
+    }
+
+
+def run_all(names, results_dir='results', workers=1, threads=1, force=False, overrides=None):
+    '''
+    Runs the named experiments, skipping those whose results are already cached, and returns
+    the results of all of them
+    '''
+    os.makedirs(results_dir, exist_ok=True)
+    results, pending = {}, {}
+    for name in names:
+        config = dict(EXPERIMENTS[name], **(overrides or {}))
+        basis = build_basis(config['basis'])
+        path = os.path.join(results_dir, '{}-{}.json'.format(name, config_hash(config, basis)))
+        if os.path.exists(path) and not force:
+            with open(path) as in_:
+                results[name] = json.load(in_)
+        else:
+            pending[name] = (path, config, basis)
+
+    if pending:
+        # download once here, otherwise every worker would fetch and write the cache at the same time
+        from helpers.mnist_data import load_mnist
+        load_mnist()
+    # spawned workers inherit the environment of this process when they start
+    saved = {name: os.environ.get(name) for name in THREAD_VARIABLES}
+    os.environ.update({name: str(threads) for name in THREAD_VARIABLES})
+    try:
+        context = multiprocessing.get_context('spawn')
+        with concurrent.futures.ProcessPoolExecutor(workers, mp_context=context, initializer=_limit_threads,
+                                                    initargs=(threads,)) as executor:
+            futures = {executor.submit(run_experiment, name, config, basis): (name, path)
+                       for name, (path, config, basis) in pending.items()}
+            for future in concurrent.futures.as_completed(futures):
+                name, path = futures[future]
+                results[name] = future.result()
+                with open(path, 'w') as out:
+                    json.dump(results[name], out, indent=1)
+    finally:
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run the notebook experiments')
+    parser.add_argument('names', nargs='*', help='experiments to run, all by default')
+    parser.add_argument('--workers', type=int, default=1, help='number of processes')
+    parser.add_argument('--threads', type=int, default=1, help='threads per process')
+    parser.add_argument('--epochs', type=int, help='override the number of epochs')
+    parser.add_argument('--results', default='results', help='directory of the cached results')
+    parser.add_argument('--force', action='store_true', help='rerun cached experiments')
+    args = parser.parse_args()
+    unknown = set(args.names) - set(EXPERIMENTS)
+    if unknown:
+        parser.error('unknown experiments {}, choose from {}'.format(sorted(unknown), list(EXPERIMENTS)))
+    overrides = {'epochs': args.epochs} if args.epochs else None
+    results = run_all(args.names or list(EXPERIMENTS), args.results, args.workers, args.threads,
+                      args.force, overrides)
+    for name, result in results.items():
+        history = result['history']
+        print('{:<18} test {:7.3f}%  train {:7.3f}%'.format(
+            name, history['val_accuracy'][-1] * 100, history['accuracy'][-1] * 100))